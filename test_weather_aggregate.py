@@ -0,0 +1,93 @@
+import random
+from functools import reduce
+
+import pytest
+
+from weather_aggregate import ColumnAggregate, WeatherAggregate
+from weather_func import tree_reduce
+
+
+def random_columns(generator, days):
+    return [list(range(731000, 731000 + days)),
+            [float(generator.randint(-10, 45)) for _ in range(days)],
+            [float(generator.randint(-20, 30)) for _ in range(days)],
+            [generator.randint(5, 100) for _ in range(days)]]
+
+
+def split_columns(generator, columns, parts):
+    cuts = sorted(generator.sample(range(1, len(columns[0])), parts - 1))
+    return [[column[start:stop] for column in columns]
+            for start, stop in zip([0] + cuts, cuts + [len(columns[0])])]
+
+
+def column_aggregate(values, days):
+    aggregate = ColumnAggregate()
+    for value, day in zip(values, days):
+        aggregate.add(value, day)
+    return aggregate
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merge_order_and_grouping_do_not_change_the_result(seed):
+    generator = random.Random(seed)
+    columns = random_columns(generator, 400)
+    expected = WeatherAggregate.from_columns(columns).to_list()
+    parts = [WeatherAggregate.from_columns(part)
+             for part in split_columns(generator, columns, 12)]
+
+    assert reduce(WeatherAggregate.merge, parts).to_list() == expected
+    assert tree_reduce(parts, WeatherAggregate.merge,
+                       WeatherAggregate()).to_list() == expected
+    generator.shuffle(parts)
+    assert reduce(WeatherAggregate.merge, parts).to_list() == expected
+    assert tree_reduce(parts, WeatherAggregate.merge,
+                       WeatherAggregate()).to_list() == expected
+    assert reduce(lambda first, second: second.merge(first),
+                  parts).to_list() == expected
+
+
+def test_mean_of_merged_parts_weighs_every_day():
+    first = column_aggregate([10.0, 20.0, 30.0], [1, 2, 3])
+    second = column_aggregate([40.0], [4])
+    assert first.merge(second).mean() == 25.0
+    assert second.merge(first).mean() == 25.0
+
+
+@pytest.mark.parametrize('values, days, maximum_date, minimum_date', [
+    ([30.0, 10.0, 30.0, 10.0], [5, 6, 2, 3], 2, 3),
+    ([10.0, 30.0, 10.0, 30.0], [2, 3, 5, 6], 3, 2),
+])
+def test_ties_keep_the_earliest_day(values, days, maximum_date,
+                                    minimum_date):
+    aggregate = column_aggregate(values, days)
+    assert (aggregate.maximum, aggregate.maximum_date) == \
+        (30.0, maximum_date)
+    assert (aggregate.minimum, aggregate.minimum_date) == \
+        (10.0, minimum_date)
+
+    later = column_aggregate(values[:2], days[:2])
+    earlier = column_aggregate(values[2:], days[2:])
+    for merged in (later.merge(earlier), earlier.merge(later)):
+        assert merged.to_list() == aggregate.to_list()
+
+
+def test_empty_aggregates_merge_to_no_change():
+    columns = random_columns(random.Random(7), 31)
+    aggregate = WeatherAggregate.from_columns(columns)
+
+    assert aggregate.merge(WeatherAggregate()).to_list() == \
+        aggregate.to_list()
+    assert WeatherAggregate().merge(aggregate).to_list() == \
+        aggregate.to_list()
+    assert WeatherAggregate().merge(WeatherAggregate()).to_list() == \
+        WeatherAggregate().to_list()
+    assert tree_reduce([WeatherAggregate(), aggregate, WeatherAggregate()],
+                       WeatherAggregate.merge,
+                       WeatherAggregate()).to_list() == aggregate.to_list()
+
+
+def test_no_parts_reduce_to_the_empty_aggregate():
+    empty = tree_reduce([], WeatherAggregate.merge, WeatherAggregate())
+    assert empty.count == 0
+    assert empty.max_temperature.mean() is None
+    assert empty.max_temperature.maximum is None
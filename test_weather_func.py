@@ -0,0 +1,139 @@
+import os
+import shutil
+
+import pytest
+
+import weather_func
+
+
+header = 'PKT,Max TemperatureC,Mean TemperatureC,Min TemperatureC,' \
+    'Max Humidity\n'
+
+
+def day_rows(first, last, humidity=60):
+    return ''.join('2004-3-{0},{1},{2},{3},{4}\n'.format(
+        day, 10 + day, 5 + day, day, humidity) for day in range(first, last))
+
+
+@pytest.fixture
+def weather_file(tmp_path):
+    file_path = tmp_path / 'Murree_weather_2004_Mar.txt'
+    file_path.write_text(header + day_rows(1, 11))
+    return file_path
+
+
+@pytest.fixture
+def resumed(monkeypatch):
+
+    """
+    Records the byte offset every parse of a weather data file
+    starts at, None for a parse from the header.
+    """
+
+    offsets = []
+    iter_weather_rows = weather_func.iter_weather_rows
+
+    def recording_iter_weather_rows(file_path, position=None, data=None):
+        offsets.append((position or {}).get('offset'))
+        return iter_weather_rows(file_path, position, data)
+
+    monkeypatch.setattr(weather_func, 'iter_weather_rows',
+                        recording_iter_weather_rows)
+    return offsets
+
+
+def fresh_result(file_path, tmp_path):
+    folder_path = tmp_path / 'fresh'
+    folder_path.mkdir(exist_ok=True)
+    copy_path = folder_path / file_path.name
+    shutil.copyfile(file_path, copy_path)
+    aggregate, columns = weather_func.update_weather_cache(str(copy_path))
+    shutil.rmtree(folder_path)
+    return aggregate.to_list(), [list(column) for column in columns]
+
+
+def cached_result(file_path):
+    aggregate, columns = weather_func.update_weather_cache(str(file_path))
+    return aggregate.to_list(), [list(column) for column in columns]
+
+
+def test_appended_rows_are_parsed_from_the_stored_offset(
+        weather_file, tmp_path, resumed):
+    cached_result(weather_file)
+    offset = os.path.getsize(weather_file)
+    with open(weather_file, 'a') as file:
+        file.write(day_rows(11, 21))
+
+    result = cached_result(weather_file)
+
+    assert resumed == [None, offset]
+    assert result == fresh_result(weather_file, tmp_path)
+    assert len(result[1][0]) == 20
+
+
+def test_unchanged_file_is_not_parsed_again(weather_file, resumed):
+    first = cached_result(weather_file)
+    assert cached_result(weather_file) == first
+    assert resumed == [None]
+
+
+def test_rewrite_with_the_same_size_is_parsed_again(
+        weather_file, tmp_path, resumed):
+    cached_result(weather_file)
+    stat = os.stat(weather_file)
+    content = weather_file.read_text()
+    weather_file.write_text(content.replace('2004-3-2,12,', '2004-3-2,42,'))
+    os.utime(weather_file, ns=(stat.st_atime_ns,
+                               stat.st_mtime_ns + 10 ** 9))
+    assert os.path.getsize(weather_file) == stat.st_size
+
+    result = cached_result(weather_file)
+
+    assert resumed == [None, None]
+    assert result == fresh_result(weather_file, tmp_path)
+    assert result[0][0][5] == 42.0
+
+
+def test_line_without_newline_is_read_again_once_completed(
+        weather_file, tmp_path, resumed):
+    with open(weather_file, 'a') as file:
+        file.write('2004-3-11,21,16,11,5')
+    first = cached_result(weather_file)
+    assert first[1][3][-1] == 5
+
+    with open(weather_file, 'a') as file:
+        file.write('0\n' + day_rows(12, 14))
+
+    result = cached_result(weather_file)
+
+    assert resumed == [None, None]
+    assert result == fresh_result(weather_file, tmp_path)
+    assert result[1][0].count(result[1][0][10]) == 1
+    assert result[1][3][10] == 50
+
+
+@pytest.mark.parametrize('text', ['2005/ab', 'x/06', '2005', '2005/13',
+                                  '2005/06-2005/x'])
+def test_invalid_month_range_is_rejected(text):
+    with pytest.raises(ValueError):
+        weather_func.parse_month_range(text)
+
+
+def test_growing_rewrite_with_the_same_tail_is_taken_as_an_append(
+        weather_file, tmp_path, resumed):
+    # only the bytes before the stored offset are compared, so the
+    # change to an earlier day is missed until the file is reparsed
+    cached_result(weather_file)
+    offset = os.path.getsize(weather_file)
+    content = weather_file.read_text()
+    weather_file.write_text(content.replace('2004-3-2,12,', '2004-3-2,42,') +
+                            day_rows(11, 13))
+    assert content[-weather_func.tail_size:] == \
+        weather_file.read_text()[offset - weather_func.tail_size:offset]
+
+    result = cached_result(weather_file)
+
+    assert resumed == [None, offset]
+    assert len(result[1][0]) == 12
+    assert result[0][0][5] == 22.0
+    assert fresh_result(weather_file, tmp_path)[0][0][5] == 42.0
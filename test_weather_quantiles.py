@@ -0,0 +1,101 @@
+import math
+import random
+
+import pytest
+
+import weather_quantiles
+from weather_quantiles import QuantileSketch
+
+
+@pytest.fixture(autouse=True)
+def seeded_compaction(monkeypatch):
+    monkeypatch.setattr(weather_quantiles, 'compaction_random',
+                        random.Random(0))
+
+
+def weight(sketch):
+    return sum(len(values) << level
+               for level, values in enumerate(sketch.levels))
+
+
+def exact_quantile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+
+def shuffled_values(seed, count):
+    values = [float(value) for value in range(count)]
+    random.Random(seed).shuffle(values)
+    return values
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_weight_equals_the_count_after_compress_and_merge(seed):
+    generator = random.Random(seed)
+    sketches = []
+    for _ in range(20):
+        sketch = QuantileSketch(generator.choice([8, 50, 200]))
+        for _ in range(generator.randint(0, 3000)):
+            sketch.add(generator.gauss(20, 8))
+        sketch.extend([generator.gauss(20, 8)
+                       for _ in range(generator.randint(0, 500))])
+        assert weight(sketch) == sketch.count
+        sketches.append(sketch)
+
+    merged = QuantileSketch()
+    for sketch in sketches:
+        merged = merged.merge(sketch)
+        assert weight(merged) == merged.count
+    assert merged.count == sum(sketch.count for sketch in sketches)
+
+
+@pytest.mark.parametrize('count', [1, 2, 31, 199])
+def test_sketch_of_at_most_k_values_is_exact(count):
+    values = shuffled_values(count, count)
+    sketch = QuantileSketch(200)
+    sketch.extend(values)
+    added = QuantileSketch(200)
+    for value in values:
+        added.add(value)
+
+    for percent in range(1, 101):
+        fraction = percent / 100
+        expected = exact_quantile(values, fraction)
+        assert sketch.quantile(fraction) == expected
+        assert added.quantile(fraction) == expected
+
+
+def test_unbounded_sketch_is_exact():
+    values = shuffled_values(1, 5000)
+    sketch = QuantileSketch(0)
+    sketch.extend(values)
+    for fraction in (0.001, 0.5, 0.95, 0.99, 1):
+        assert sketch.quantile(fraction) == exact_quantile(values, fraction)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_rank_error_stays_within_the_documented_bound(seed):
+    count = 100000
+    values = shuffled_values(seed, count)
+    added = QuantileSketch()
+    for value in values:
+        added.add(value)
+    merged = QuantileSketch()
+    for start in range(0, count, 1000):
+        part = QuantileSketch()
+        part.extend(values[start:start + 1000])
+        merged = merged.merge(part)
+
+    for sketch in (added, merged):
+        assert sketch.size() <= 3 * sketch.k
+        for permille in range(1, 1001):
+            fraction = permille / 1000
+            # the values are 0 to count - 1, so value + 1 is its rank
+            rank = sketch.quantile(fraction) + 1
+            expected = max(1, math.ceil(fraction * count))
+            assert abs(rank - expected) <= 1.7 / sketch.k * count
+
+
+def test_empty_sketch_has_no_quantile():
+    assert QuantileSketch().quantile(0.5) is None
+    assert QuantileSketch().merge(QuantileSketch()).quantile(0.5) is None
@@ -0,0 +1,99 @@
+import os
+from datetime import date
+
+import pytest
+
+import weather_bench
+import weather_query
+
+
+columns = ['Max TemperatureC', 'Max Humidity']
+aggregations = ('count', 'min', 'max', 'sum')
+
+
+def full_scan(folder_path, where):
+
+    """
+    Aggregates the columns of every row of every file in the date
+    range by month, reading the files from start to end.
+    """
+
+    groups = {}
+    for file_name in os.listdir(folder_path):
+        if not file_name.endswith('.txt'):
+            continue
+        with open(os.path.join(folder_path, file_name)) as file:
+            header = [name.strip() for name in next(file).split(',')]
+            indexes = [header.index(column) for column in columns]
+            for line in file:
+                fields = line.rstrip('\n').split(',')
+                try:
+                    year, month, day = (int(part)
+                                        for part in fields[0].split('-'))
+                except ValueError:
+                    continue
+                if not where[0] <= date(year, month, day).toordinal() <= \
+                        where[1]:
+                    continue
+                group = groups.setdefault((year, month),
+                                          [[] for _ in columns])
+                for values, index in zip(group, indexes):
+                    if fields[index]:
+                        values.append(float(fields[index]))
+
+    return [(key, [{'count': len(values), 'min': min(values),
+                    'max': max(values), 'sum': sum(values)}
+                   for values in groups[key]])
+            for key in sorted(groups)]
+
+
+def assert_same_rows(rows, expected):
+    assert [key for key, _ in rows] == [key for key, _ in expected]
+    for (_, results), (_, expected_results) in zip(rows, expected):
+        for result, expected_result in zip(results, expected_results):
+            assert result['count'] == expected_result['count']
+            assert result['min'] == expected_result['min']
+            assert result['max'] == expected_result['max']
+            assert result['sum'] == pytest.approx(expected_result['sum'])
+
+
+@pytest.fixture
+def folder_path(tmp_path):
+    weather_bench.generate_weather_folder(str(tmp_path), [2004, 2005],
+                                          stations=2, missing_rate=0.05,
+                                          seed=1)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('first, last', [
+    (date(2004, 6, 15), date(2005, 2, 10)),
+    (date(2004, 3, 1), date(2004, 3, 31)),
+    (date(2005, 12, 31), date(2005, 12, 31)),
+])
+def test_between_matches_a_full_scan(folder_path, first, last):
+    where = (first.toordinal(), last.toordinal())
+    expected = full_scan(folder_path, where)
+
+    # the first query builds the day index of every file it reads,
+    # the second seeks with the cached one
+    for _ in range(2):
+        assert_same_rows(weather_query.query(folder_path, columns,
+                                             aggregations, 'month', where),
+                         expected)
+
+
+def test_between_matches_a_full_scan_with_unordered_days(folder_path):
+    file_path = os.path.join(folder_path, 'Lahore_weather_2004_Jul.txt')
+    with open(file_path) as file:
+        lines = file.readlines()
+    rows = [line for line in lines[1:] if line[:1].isdigit()]
+    with open(file_path, 'w') as file:
+        file.writelines([lines[0]] + rows[::-1] +
+                        [line for line in lines[1:] if line not in rows])
+
+    where = (date(2004, 7, 10).toordinal(), date(2004, 7, 20).toordinal())
+    expected = full_scan(folder_path, where)
+    for _ in range(2):
+        assert_same_rows(weather_query.query(folder_path, columns,
+                                             aggregations, 'month', where),
+                         expected)
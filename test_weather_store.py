@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import weather_bench
+import weather_store
+
+
+@pytest.fixture
+def folder_path(tmp_path):
+    weather_bench.generate_weather_folder(str(tmp_path), [2004],
+                                          stations=2, seed=3)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    built = []
+    build_store = weather_store.build_store
+
+    def counting_build_store(folder_path):
+        built.append(folder_path)
+        build_store(folder_path)
+
+    monkeypatch.setattr(weather_store, 'build_store', counting_build_store)
+    return built
+
+
+def month_rows(store, year, month):
+    return sum(len(columns[0]) for columns in store.slices(year, month))
+
+
+def open_and_count(folder_path, year, month):
+    store = weather_store.open_store(folder_path)
+    try:
+        return month_rows(store, year, month)
+    finally:
+        store.close()
+
+
+def append_day(file_path):
+    with open(file_path) as file:
+        lines = file.readlines()
+    last = max(number for number, line in enumerate(lines)
+               if line[:1].isdigit())
+    lines.insert(last + 1, lines[last])
+    with open(file_path, 'w') as file:
+        file.writelines(lines)
+
+
+def test_unchanged_folder_reuses_the_store(folder_path, builds):
+    first = open_and_count(folder_path, 2004, 6)
+    assert open_and_count(folder_path, 2004, 6) == first
+    assert len(builds) == 1
+
+
+def test_store_is_rebuilt_when_a_file_grows(folder_path, builds):
+    first = open_and_count(folder_path, 2004, 6)
+    file_path = os.path.join(folder_path, 'Lahore_weather_2004_Jun.txt')
+    folder_mtime_ns = os.stat(folder_path).st_mtime_ns
+    append_day(file_path)
+    assert os.stat(folder_path).st_mtime_ns == folder_mtime_ns
+
+    assert open_and_count(folder_path, 2004, 6) == first + 1
+    assert len(builds) == 2
+
+
+def test_store_is_rebuilt_when_only_the_mtime_changes(folder_path, builds):
+    open_and_count(folder_path, 2004, 6)
+    file_path = os.path.join(folder_path, 'Lahore_weather_2004_Jun.txt')
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    open_and_count(folder_path, 2004, 6)
+    assert len(builds) == 2
+    open_and_count(folder_path, 2004, 6)
+    assert len(builds) == 2
+
+
+def test_unwritable_store_falls_back_to_the_files(folder_path, monkeypatch,
+                                                  capsys):
+    def failing_build_store(folder_path):
+        raise PermissionError(13, 'Permission denied')
+
+    monkeypatch.setattr(weather_store, 'build_store', failing_build_store)
+    assert weather_store.open_store(folder_path) is None
+    assert 'reading the weather data files instead' in \
+        capsys.readouterr().err
@@ -0,0 +1,157 @@
+class ColumnAggregate:
+
+    """
+    Running statistics of one weather data column: the number of
+    values, their sum and sum of squares, and the minimum and maximum
+    along with the day ordinals they were recorded on.
+
+    Aggregates are merged with merge, which is associative and
+    commutative, so results of files, months and years can be
+    combined in any order. When two days share the same extreme
+    value the earlier day is kept.
+    """
+
+    __slots__ = ('count', 'total', 'total_squares',
+                 'minimum', 'minimum_date', 'maximum', 'maximum_date')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+        self.minimum = None
+        self.minimum_date = None
+        self.maximum = None
+        self.maximum_date = None
+
+    def add(self, value, day):
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+
+        if self.minimum is None or value < self.minimum or \
+                (value == self.minimum and day < self.minimum_date):
+            self.minimum = value
+            self.minimum_date = day
+
+        if self.maximum is None or value > self.maximum or \
+                (value == self.maximum and day < self.maximum_date):
+            self.maximum = value
+            self.maximum_date = day
+
+    def merge(self, other):
+
+        """
+        This method combines two aggregates into a new one
+        covering the values of both.
+
+        Parameters:
+            other (ColumnAggregate): The aggregate to combine with.
+
+        Returns:
+            merged (ColumnAggregate): The combined aggregate.
+        """
+
+        merged = ColumnAggregate()
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        merged.total_squares = self.total_squares + other.total_squares
+
+        for part in (self, other):
+            if part.count == 0:
+                continue
+            if merged.minimum is None or part.minimum < merged.minimum or \
+                    (part.minimum == merged.minimum and
+                     part.minimum_date < merged.minimum_date):
+                merged.minimum = part.minimum
+                merged.minimum_date = part.minimum_date
+            if merged.maximum is None or part.maximum > merged.maximum or \
+                    (part.maximum == merged.maximum and
+                     part.maximum_date < merged.maximum_date):
+                merged.maximum = part.maximum
+                merged.maximum_date = part.maximum_date
+
+        return merged
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def variance(self):
+        if self.count == 0:
+            return None
+        mean = self.total / self.count
+        return max(self.total_squares / self.count - mean * mean, 0.0)
+
+    def to_list(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        aggregate = cls()
+        for name, value in zip(cls.__slots__, values):
+            setattr(aggregate, name, value)
+        return aggregate
+
+
+class WeatherAggregate:
+
+    """
+    The statistics the weather reports need from a set of days:
+    one ColumnAggregate each for the highest temperature, the lowest
+    temperature and the highest humidity columns.
+    """
+
+    __slots__ = ('max_temperature', 'min_temperature', 'max_humidity')
+
+    def __init__(self):
+        self.max_temperature = ColumnAggregate()
+        self.min_temperature = ColumnAggregate()
+        self.max_humidity = ColumnAggregate()
+
+    @classmethod
+    def from_columns(cls, columns):
+
+        """
+        This method builds the aggregate of the typed columns
+        of a weather data file in a single pass.
+
+        Parameters:
+            columns (list): The date, highest temperature, lowest
+            temperature and highest humidity columns.
+
+        Returns:
+            aggregate (WeatherAggregate): The aggregate of the columns.
+        """
+
+        aggregate = cls()
+        add_max_temperature = aggregate.max_temperature.add
+        add_min_temperature = aggregate.min_temperature.add
+        add_max_humidity = aggregate.max_humidity.add
+
+        for day, max_temp, min_temp, humidity in zip(*columns):
+            add_max_temperature(max_temp, day)
+            add_min_temperature(min_temp, day)
+            add_max_humidity(humidity, day)
+        return aggregate
+
+    def merge(self, other):
+        merged = WeatherAggregate()
+        for name in self.__slots__:
+            setattr(merged, name,
+                    getattr(self, name).merge(getattr(other, name)))
+        return merged
+
+    @property
+    def count(self):
+        return self.max_temperature.count
+
+    def to_list(self):
+        return [getattr(self, name).to_list() for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        aggregate = cls()
+        for name, column in zip(cls.__slots__, values):
+            setattr(aggregate, name, ColumnAggregate.from_list(column))
+        return aggregate
@@ -0,0 +1,333 @@
+import argparse
+import itertools
+import os
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.dataset as ds
+
+import weather_cache
+import weather_catalog
+from weather_aggregate import ColumnAggregate, WeatherAggregate
+from weather_func import (
+    highest_humidity,
+    highest_temperature,
+    lowest_temperature,
+    open_weather_file
+)
+
+
+dataset_folder_name = 'parquet'
+
+partition_schema = pa.schema([('year', pa.int16()), ('month', pa.int8())])
+
+# columns that hold text rather than numbers
+text_columns = ['Events']
+
+epoch_ordinal = date(1970, 1, 1).toordinal()
+
+
+def read_weather_table(file_path):
+
+    """
+    This function reads a whole weather data file into an Arrow table
+    with typed columns. The first column, whatever the name of its
+    time zone, becomes a date32 column named Date, the Events column
+    stays text and every other column becomes float64. Column names
+    are stripped and empty cells become nulls. Rows cut short are
+    kept with their missing cells as nulls, as the other backends
+    do, while lines such as the closing <!-- --> comment are skipped.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        table (pyarrow.Table): The rows of the file.
+    """
+
+    short_rows = []
+
+    def keep_short_row(row):
+        if row.text and 1 < row.actual_columns < row.expected_columns:
+            short_rows.append(row.text + ',' * (row.expected_columns -
+                                                row.actual_columns))
+        return 'skip'
+
+    convert_options = csv.ConvertOptions(strings_can_be_null=True)
+    with open_weather_file(file_path) as file:
+        table = csv.read_csv(
+            file,
+            parse_options=csv.ParseOptions(
+                invalid_row_handler=keep_short_row),
+            convert_options=convert_options)
+
+    table = typed_table(table)
+    if short_rows:
+        short_table = csv.read_csv(
+            pa.py_buffer('\n'.join(short_rows).encode()),
+            read_options=csv.ReadOptions(column_names=table.column_names),
+            convert_options=convert_options)
+        table = pa.concat_tables([table, typed_table(short_table)])
+        table = table.sort_by('Date')
+    return table
+
+
+def typed_table(table):
+    columns = []
+    names = []
+    for index, (name, column) in enumerate(zip(table.column_names,
+                                               table.columns)):
+        name = name.strip()
+        if index == 0:
+            name = 'Date'
+            column = pc.strptime(column.cast(pa.string()),
+                                 format='%Y-%m-%d', unit='s')
+            column = column.cast(pa.date32())
+        elif name in text_columns:
+            column = column.cast(pa.string())
+        else:
+            column = column.cast(pa.float64())
+        names.append(name)
+        columns.append(column)
+    return pa.table(columns, names=names)
+
+
+def conform(table, schema):
+
+    """
+    This function orders the columns of a table as in the schema and
+    casts them to its types. Columns the table does not have are
+    filled with nulls and columns the schema does not have are left
+    out, so files with different headers fit into one dataset.
+    """
+
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table[field.name].cast(field.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, field.type))
+    return pa.table(columns, schema=schema)
+
+
+def convert_folder(folder_path, output_path, compression='zstd'):
+
+    """
+    This function converts all weather data files in the given folder
+    into a Parquet dataset partitioned by year and month, written as
+    output_path/year=YYYY/month=M/*.parquet. Every row also gets the
+    station from the name of its file. Files are read and written one
+    at a time, so the folder never has to fit into memory.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        output_path (str): The folder to write the dataset into.
+        Partitions already there are replaced.
+        compression (str): The Parquet compression codec, such as
+        'zstd', 'snappy', 'gzip' or 'none'.
+
+    Returns:
+        counts (dict): The number of files and rows converted.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+    counts = {'files': 0, 'rows': 0}
+
+    def tables():
+        for year, month, station, file_name in catalog.entries:
+            table = read_weather_table(os.path.join(folder_path, file_name))
+            if table.num_rows == 0:
+                continue
+            rows = table.num_rows
+            counts['files'] += 1
+            counts['rows'] += rows
+            table = table.append_column('station',
+                                        pa.array([station] * rows))
+            table = table.append_column('year',
+                                        pa.array([year] * rows, pa.int16()))
+            yield table.append_column('month',
+                                      pa.array([month] * rows, pa.int8()))
+
+    tables = tables()
+    first = next(tables, None)
+    if first is None:
+        return counts
+    schema = first.schema
+
+    ds.write_dataset(
+        (batch for table in itertools.chain([first], tables)
+         for batch in conform(table, schema).to_batches()),
+        output_path, schema=schema, format='parquet',
+        partitioning=ds.partitioning(partition_schema, flavor='hive'),
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression=None if compression == 'none' else compression),
+        existing_data_behavior='delete_matching')
+    return counts
+
+
+def dataset_path(folder_path):
+    return os.path.join(folder_path, weather_cache.cache_folder_name,
+                        dataset_folder_name)
+
+
+def open_dataset(dataset_path):
+
+    """
+    This function opens a dataset written by convert_folder. A path
+    that is missing, holds no Parquet files, or whose files lack the
+    date or a report column raises a ValueError saying why.
+
+    Parameters:
+        dataset_path (str): The folder of the dataset.
+
+    Returns:
+        dataset (pyarrow.dataset.Dataset): The opened dataset.
+    """
+
+    if not os.path.exists(dataset_path):
+        raise ValueError("The dataset '{}' does not exist. Create it with "
+                         "'weather_report.py convert'.".format(dataset_path))
+    if not os.path.isdir(dataset_path):
+        raise ValueError("The dataset '{}' is not a folder.".format(
+            dataset_path))
+    try:
+        dataset = ds.dataset(dataset_path, format='parquet',
+                             partitioning=ds.partitioning(partition_schema,
+                                                          flavor='hive'))
+    except (OSError, pa.ArrowInvalid) as error:
+        raise ValueError("'{}' is not a Parquet dataset: {}".format(
+            dataset_path, str(error).splitlines()[0]))
+
+    if not dataset.files:
+        raise ValueError("The dataset '{}' holds no Parquet files.".format(
+            dataset_path))
+    missing = [name for name in ['Date', highest_temperature,
+                                 lowest_temperature, highest_humidity]
+               if name not in dataset.schema.names]
+    if missing:
+        raise ValueError("The dataset '{}' lacks the columns {}. Convert "
+                         "the folder again.".format(dataset_path,
+                                                    ', '.join(missing)))
+    return dataset
+
+
+def column_aggregate(days, values, cast):
+
+    """
+    This function builds a ColumnAggregate from an Arrow column with
+    Arrow compute kernels. Of the days sharing an extreme value the
+    earliest is used, as in the other backends.
+    """
+
+    aggregate = ColumnAggregate()
+    if len(values) == 0:
+        return aggregate
+
+    aggregate.count = len(values)
+    aggregate.total = cast(pc.sum(values).as_py())
+    aggregate.total_squares = cast(pc.sum(pc.multiply(values,
+                                                      values)).as_py())
+
+    extremes = pc.min_max(values)
+    for name in ('minimum', 'maximum'):
+        value = extremes[name[:3]]
+        day = pc.min(pc.filter(days, pc.equal(values, value))).as_py()
+        setattr(aggregate, name, cast(value.as_py()))
+        setattr(aggregate, name + '_date', day + epoch_ordinal)
+    return aggregate
+
+
+def table_aggregate(table):
+    days = table['Date'].cast(pa.int32())
+    aggregate = WeatherAggregate()
+    aggregate.max_temperature = column_aggregate(
+        days, table[highest_temperature], float)
+    aggregate.min_temperature = column_aggregate(
+        days, table[lowest_temperature], float)
+    aggregate.max_humidity = column_aggregate(
+        days, table[highest_humidity], int)
+    return aggregate
+
+
+def read_days(dataset, year, month=None, columns=()):
+    condition = ds.field('year') == int(year)
+    if month is not None:
+        condition = condition & (ds.field('month') == int(month))
+    return dataset.to_table(
+        columns=['Date', highest_temperature, lowest_temperature,
+                 highest_humidity] + list(columns),
+        filter=condition).drop_null()
+
+
+def dataset_aggregates(dataset, year, month=None):
+
+    """
+    This function builds the aggregate of a year, or a single month
+    of it, from a dataset written by convert_folder. Only the year and
+    month partitions asked for are opened, and only the date and the
+    three report columns are read from them. Days with any of the
+    three values missing are left out, as in the other backends.
+
+    Parameters:
+        dataset (pyarrow.dataset.Dataset): The opened dataset.
+        year (int): The year to collect.
+        month (int): The month number to collect, or None
+        for the whole year.
+
+    Returns:
+        aggregates (list): A single WeatherAggregate.
+    """
+
+    return [table_aggregate(read_days(dataset, year, month))]
+
+
+def dataset_station_aggregates(dataset, year, month=None):
+
+    """
+    This function builds the aggregate of every station for a year,
+    or a single month of it, from a dataset written by
+    convert_folder, grouping the days by its station column.
+
+    Returns:
+        station_aggregates (dict): The WeatherAggregate of every
+        station, by station name in alphabetical order.
+    """
+
+    table = read_days(dataset, year, month, ['station'])
+    return {station: table_aggregate(
+                table.filter(pc.equal(table['station'], station)))
+            for station in sorted(pc.unique(table['station']).to_pylist())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="weather_report.py convert",
+                                     description="Convert weather data \
+        files into a Parquet dataset partitioned by year and month")
+    parser.add_argument("folder_path", help="Path to \
+        the folder containing weather data files.")
+    parser.add_argument("output_path", nargs="?", help="Folder to write \
+        the dataset into. Defaults to the parquet folder in the cache \
+            folder of folder_path, so that the data folder itself is not \
+                changed.")
+    parser.add_argument("--compression", default="zstd",
+                        choices=["zstd", "snappy", "gzip", "none"],
+                        help="Parquet compression codec.")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.folder_path):
+        print("Error: The folder path '{}' does not "
+              "exist.".format(args.folder_path))
+        return
+
+    output_path = args.output_path
+    if output_path is None:
+        weather_cache.cache_dir(args.folder_path)
+        output_path = dataset_path(args.folder_path)
+    counts = convert_folder(args.folder_path, output_path, args.compression)
+    print("Converted {} files with {} rows into '{}'".format(
+        counts['files'], counts['rows'], output_path))
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import weather_cache
+import weather_metrics
+from weather_aggregate import WeatherAggregate
+from weather_func import (
+    column_types,
+    open_weather_file,
+    stat_weather_file,
+    update_weather_cache
+)
+
+
+def read_if_changed(file_path):
+
+    """
+    This function is run in a worker thread. It returns the stored
+    aggregate of a weather data file whose cache entry is current,
+    and otherwise reads the whole file.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+
+    Returns:
+        aggregate (WeatherAggregate): The stored aggregate, or None.
+        data (bytes): The decompressed contents of the file, or None.
+        stat (os.stat_result): The status of the file before reading.
+        header (dict): The header of the cache entry, or None.
+    """
+
+    stat = stat_weather_file(file_path)
+    header = weather_cache.read_cache_header(file_path, column_types)
+    if header is not None and weather_cache.is_current(header, stat):
+        return (WeatherAggregate.from_list(header['aggregate']), None, stat,
+                header)
+
+    with open_weather_file(file_path) as file:
+        return None, file.read(), stat, header
+
+
+async def read_file_aggregate(file_path, semaphore):
+
+    """
+    This coroutine builds the aggregate of a weather data file. The
+    blocking stat and read calls run in a worker thread while the
+    semaphore is held. Once the bytes arrive, they are parsed and the
+    cache entry written in another worker thread, so the event loop
+    goes on starting the reads of other files.
+    """
+
+    async with semaphore:
+        aggregate, data, stat, header = await asyncio.to_thread(
+            read_if_changed, file_path)
+    if aggregate is not None:
+        if weather_metrics.active is not None:
+            weather_metrics.active.count('files_cached')
+        return aggregate
+    aggregate, _ = await asyncio.to_thread(
+        update_weather_cache, file_path, with_columns=False, data=data,
+        stat=stat, header=header)
+    return aggregate
+
+
+async def read_aggregates(file_paths, concurrency):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[read_file_aggregate(file_path, semaphore)
+                                  for file_path in file_paths])
+
+
+def collect_file_aggregates(file_paths, concurrency):
+
+    """
+    This function builds the aggregates of many weather data files
+    while keeping up to concurrency file reads in flight, so on
+    high-latency storage the open and read round trips of different
+    files overlap instead of adding up.
+
+    Parameters:
+        file_paths (list): The paths to the weather data files.
+        concurrency (int): The most reads in flight at once.
+
+    Returns:
+        aggregates (list): One WeatherAggregate per file, in order.
+    """
+
+    return asyncio.run(read_aggregates(file_paths, concurrency))
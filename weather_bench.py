@@ -0,0 +1,392 @@
+import argparse
+import calendar
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import weather_cache
+import weather_catalog
+from weather_aggregate import WeatherAggregate
+from weather_func import (
+    collect_aggregates,
+    tree_reduce
+)
+
+
+murree_header = [
+    'PKT', 'Max TemperatureC', 'Mean TemperatureC', 'Min TemperatureC',
+    'Dew PointC', 'MeanDew PointC', 'Min DewpointC', 'Max Humidity',
+    ' Mean Humidity', ' Min Humidity', ' Max Sea Level PressurehPa',
+    ' Mean Sea Level PressurehPa', ' Min Sea Level PressurehPa',
+    ' Max VisibilityKm', ' Mean VisibilityKm', ' Min VisibilitykM',
+    ' Max Wind SpeedKm/h', ' Mean Wind SpeedKm/h', ' Max Gust SpeedKm/h',
+    'Precipitationmm', ' CloudCover', ' Events', 'WindDirDegrees']
+
+station_names = ['Murree', 'Lahore', 'Dubai', 'Karachi', 'Islamabad']
+
+scenario_names = ['year', 'average', 'chart']
+
+# libraries that only the chart mode may import
+plotting_modules = ('matplotlib', 'PIL', 'numpy')
+
+# generated rows need the columns up to the last one the reports read
+min_column_count = murree_header.index('Max Humidity') + 1
+
+
+def station_name(number):
+    if number < len(station_names):
+        return station_names[number]
+    return 'Station{}'.format(number + 1)
+
+
+def generate_weather_folder(folder_path, years, stations=1,
+                            missing_rate=0.02, column_count=23, seed=0):
+
+    """
+    This function writes monthly weather data files in the format of
+    the Murree station files, one per station, year and month, with
+    seasonal temperatures and a share of empty cells.
+
+    Parameters:
+        folder_path (str): The folder to write the files into.
+        years (list): The years to generate.
+        stations (int): The number of stations.
+        missing_rate (float): The chance that a report value is empty.
+        column_count (int): The number of columns per row. Columns past
+        the 23 of the Murree files are filled with extra readings.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        counts (dict): The number of files, rows and bytes written.
+    """
+
+    os.makedirs(folder_path, exist_ok=True)
+    generator = random.Random(seed)
+
+    header = murree_header[:column_count] + [
+        'Extra{}'.format(number)
+        for number in range(len(murree_header), column_count)]
+    counts = {'files': 0, 'rows': 0, 'bytes': 0}
+
+    for station in range(stations):
+        offset = generator.uniform(-4, 4)
+        for year in years:
+            for month in range(1, 13):
+                season = -math.cos((month - 1) / 12 * 2 * math.pi)
+                lines = [','.join(header)]
+                for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                    high = round(22 + 12 * season + offset +
+                                 generator.gauss(0, 4))
+                    low = high - generator.randint(4, 14)
+                    humidity = generator.randint(20, 100)
+                    cells = ['{}-{}-{}'.format(year, month, day),
+                             str(high), str((high + low) // 2), str(low)]
+                    cells += [str(generator.randint(-5, 20))
+                              for _ in range(3)]
+                    cells += [str(humidity), str(humidity - 15),
+                              str(humidity - 30)]
+                    cells += [str(generator.randint(0, 1030))
+                              for _ in range(10, column_count)]
+                    for index in (1, 3, 7):
+                        if generator.random() < missing_rate:
+                            cells[index] = ''
+                    lines.append(','.join(cells[:column_count]))
+                    counts['rows'] += 1
+                lines.append('<!-- 0.262:0 -->')
+
+                file_name = '{}_weather_{}_{}.txt'.format(
+                    station_name(station), year,
+                    weather_catalog.month_names[month - 1])
+                text = '\n'.join(lines) + '\n'
+                with open(os.path.join(folder_path, file_name), 'w') as file:
+                    file.write(text)
+                counts['files'] += 1
+                counts['bytes'] += len(text)
+
+    return counts
+
+
+def run_scenario(scenario, folder_path, years, cold, jobs, backend):
+
+    """
+    This function runs one timed scenario over the folder. It is run
+    in a fresh process so that its peak memory is measured on its own.
+
+    Parameters:
+        scenario (str): 'year' for the yearly extrema, 'average' for
+        the average of every month, or 'chart' for rendering the
+        daily chart of every station and month to PNG files in a
+        temporary folder.
+        folder_path (str): The path to the folder
+        containing weather data files.
+        years (list): The years to query.
+        cold (bool): Whether the cache is removed before running.
+        jobs (int): The number of worker processes for year reports.
+        backend (str): 'python' or 'numpy'.
+
+    Returns:
+        result (dict): The timings, counts and peak memory.
+    """
+
+    if cold:
+        shutil.rmtree(os.path.join(folder_path,
+                                   weather_cache.cache_folder_name),
+                      ignore_errors=True)
+
+    files = 0
+    rows = 0
+    start = time.perf_counter()
+
+    if scenario == 'year':
+        for year in years:
+            aggregates = collect_aggregates(folder_path, year, jobs=jobs,
+                                            backend=backend)
+            aggregate = tree_reduce(aggregates, WeatherAggregate.merge,
+                                    WeatherAggregate())
+            files += len(aggregates)
+            rows += aggregate.count
+    elif scenario == 'average':
+        for year in years:
+            for month in range(1, 13):
+                aggregates = collect_aggregates(folder_path, year, month,
+                                                backend=backend)
+                aggregate = tree_reduce(aggregates, WeatherAggregate.merge,
+                                        WeatherAggregate())
+                aggregate.max_temperature.mean()
+                files += len(aggregates)
+                rows += aggregate.count
+    elif scenario == 'chart':
+        import weather_chart
+        catalog = weather_catalog.load_catalog(folder_path)
+        renderer = weather_chart.ChartRenderer()
+        with tempfile.TemporaryDirectory() as output_dir:
+            for year in years:
+                for month in range(1, 13):
+                    stations = sorted({entry[2] for entry
+                                       in catalog.select(year, month)})
+                    for station in stations:
+                        dates, highs, lows = weather_chart.month_day_columns(
+                            folder_path, [(year, month)], station=station)
+                        renderer.render_daily(
+                            dates, highs, lows, False, station,
+                            os.path.join(output_dir, '{}_{}_{:02d}.png'.format(
+                                station, year, month)))
+                        rows += len(dates)
+                    files += len(catalog.files(year, month))
+    else:
+        raise ValueError('Unknown scenario: {}'.format(scenario))
+
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+
+    return {
+        'scenario': scenario,
+        'cache': 'cold' if cold else 'warm',
+        'seconds': seconds,
+        'files': files,
+        'rows': rows,
+        'files_per_second': files / seconds if seconds else None,
+        'rows_per_second': rows / seconds if seconds else None,
+        'peak_rss_bytes': peak_rss,
+    }
+
+
+def run_benchmarks(folder_path, years, scenarios, repeat=3, jobs=1,
+                   backend='python', caches=('cold', 'warm')):
+
+    """
+    This function runs every scenario repeat times for every cache
+    state, each run in its own process, and keeps the fastest run.
+
+    Returns:
+        results (list): One result dict per scenario and cache state.
+    """
+
+    results = []
+    context = get_context('spawn')
+    for scenario in scenarios:
+        for cache in caches:
+            runs = []
+            for _ in range(repeat):
+                if cache == 'warm':
+                    with ProcessPoolExecutor(1, mp_context=context) as pool:
+                        pool.submit(run_scenario, scenario, folder_path,
+                                    years, False, jobs, backend).result()
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    runs.append(pool.submit(
+                        run_scenario, scenario, folder_path, years,
+                        cache == 'cold', jobs, backend).result())
+            best = min(runs, key=lambda run: run['seconds'])
+            best['repeat'] = repeat
+            results.append(best)
+    return results
+
+
+def measure_startup(folder_path, year):
+
+    """
+    This function runs the year (-e) and average (-a) reports of
+    weather_report.py under python -X importtime and checks that
+    neither of them imports a plotting library.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        year (int): The year to report on.
+
+    Returns:
+        results (list): For every command, its wall time, the total
+        import time and the plotting modules that were imported.
+    """
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'weather_report.py')
+    commands = [['-e', str(year)], ['-a', '{}/01'.format(year)]]
+
+    results = []
+    for flags in commands:
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', script, folder_path] +
+            flags, capture_output=True, text=True, check=True)
+        seconds = time.perf_counter() - start
+
+        import_microseconds = 0
+        plotting_imports = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not cumulative.strip().isdigit():
+                continue
+            if not name[1:].startswith(' '):
+                import_microseconds += int(cumulative)
+            if name.strip().split('.')[0] in plotting_modules:
+                plotting_imports.append(name.strip())
+
+        results.append({
+            'command': ' '.join(['weather_report.py'] + flags),
+            'seconds': seconds,
+            'import_microseconds': import_microseconds,
+            'plotting_imports': plotting_imports,
+        })
+    return results
+
+
+def parse_years(text):
+    if '-' in text:
+        first, last = text.split('-')
+        return list(range(int(first), int(last) + 1))
+    return [int(text)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weatherman benchmarks")
+    parser.add_argument("--folder", help="Folder of weather data files to \
+        benchmark. Synthetic files are generated into a temporary \
+            folder when it is not given.")
+    parser.add_argument("--years", default="2000-2009", help="Years to \
+        generate and query, as YYYY or YYYY-YYYY.")
+    parser.add_argument("--stations", type=int, default=1, help="Number \
+        of stations to generate.")
+    parser.add_argument("--missing-rate", type=float, default=0.02,
+                        help="Share of empty report values to generate.")
+    parser.add_argument("--columns", type=int, default=23, help="Number \
+        of columns per generated row, at least {} so that the rows have \
+            the columns of the reports.".format(min_column_count))
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the \
+        synthetic data generator.")
+    parser.add_argument("--scenario", action="append",
+                        choices=scenario_names, help="Scenario to run. \
+        May be given more than once. All scenarios run by default.")
+    parser.add_argument("--cache", choices=["cold", "warm", "both"],
+                        default="both", help="Run with an empty cache, \
+        a filled cache, or both.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per \
+        scenario. The fastest run is reported.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number \
+        of worker processes for year reports.")
+    parser.add_argument("--backend", choices=["python", "numpy"],
+                        default="python", help="Parsing backend.")
+    parser.add_argument("--startup", action="store_true", help="Only \
+        measure the startup time of the non-chart reports. Exits with \
+            status 1 when they import a plotting library.")
+    parser.add_argument("--output", help="Write the JSON results to \
+        this file instead of standard output.")
+
+    args = parser.parse_args()
+    if args.columns < min_column_count:
+        parser.error("--columns must be at least {}, the columns up to "
+                     "Max Humidity.".format(min_column_count))
+    years = parse_years(args.years)
+
+    temporary_folder = None
+    folder_path = args.folder
+    generated = None
+    if folder_path is None:
+        temporary_folder = tempfile.mkdtemp(prefix='weather_bench_')
+        folder_path = temporary_folder
+        generated = generate_weather_folder(
+            folder_path, years, args.stations, args.missing_rate,
+            args.columns, args.seed)
+
+    results = []
+    startup = None
+    try:
+        if args.startup:
+            startup = measure_startup(folder_path, years[0])
+        else:
+            results = run_benchmarks(
+                folder_path, years, args.scenario or scenario_names,
+                args.repeat, args.jobs, args.backend,
+                ('cold', 'warm') if args.cache == 'both' else (args.cache,))
+    finally:
+        if temporary_folder is not None:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'folder': args.folder,
+            'years': args.years,
+            'stations': args.stations,
+            'missing_rate': args.missing_rate,
+            'columns': args.columns,
+            'seed': args.seed,
+            'jobs': args.jobs,
+            'backend': args.backend,
+        },
+        'generated': generated,
+        'results': results,
+        'startup': startup,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + '\n')
+    else:
+        print(text)
+
+    if startup and any(result['plotting_imports'] for result in startup):
+        print("Non-chart reports import a plotting library.",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import array
+import json
+import os
+
+
+cache_folder_name = '.weather_cache'
+cache_version = 4
+
+# joins the path of a zip or tar bundle to the name of a file in it
+archive_separator = '::'
+
+
+def cache_dir(folder_path):
+
+    """
+    This function returns the cache folder that sits next to
+    the weather data files, creating it if it does not exist.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+
+    Returns:
+        cache_path (str): The path to the cache folder.
+    """
+
+    cache_path = os.path.join(folder_path, cache_folder_name)
+    os.makedirs(cache_path, exist_ok=True)
+    return cache_path
+
+
+def split_archive_path(file_path):
+
+    """
+    This function splits the path of a weather data file stored in a
+    bundle, such as data/2004.zip::Murree_weather_2004_Aug.txt, into
+    the path of the bundle and the name of the file in it.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+
+    Returns:
+        path (str): The path of the bundle, or file_path itself
+        when the file is not in a bundle.
+        member (str): The name of the file in the bundle, or None.
+    """
+
+    path, separator, member = file_path.partition(archive_separator)
+    return path, member if separator else None
+
+
+def columns_cache_path(file_path):
+    path, member = split_archive_path(file_path)
+    folder_path, file_name = os.path.split(path)
+    if member is not None:
+        file_name += archive_separator + member.replace('/', '%2F')
+    return os.path.join(folder_path, cache_folder_name, file_name + '.cols')
+
+
+def read_cache_header(file_path, column_types):
+
+    """
+    This function reads the header line of the cache entry of a
+    weather data file. The header records the size and modification
+    time of the file when the entry was written, where parsing can
+    resume when rows are appended, and the aggregate of the file.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+        column_types (list): (column name, array typecode) pairs
+        in the order the columns are stored.
+
+    Returns:
+        header (dict): The header, or None when there is no usable
+        cache entry for the file.
+    """
+
+    try:
+        with open(columns_cache_path(file_path), 'rb') as cache_file:
+            header = json.loads(cache_file.readline())
+    except (OSError, ValueError):
+        return None
+
+    if header.get('version') != cache_version or \
+            header.get('columns') != [list(column)
+                                      for column in column_types]:
+        return None
+    return header
+
+
+def is_current(header, stat):
+    return header['size'] == stat.st_size and \
+        header['mtime_ns'] == stat.st_mtime_ns
+
+
+def read_cached_columns(file_path, column_types):
+
+    """
+    This function reads the typed columns of a weather data file
+    from its cache entry.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+        column_types (list): (column name, array typecode) pairs
+        in the order the columns are stored.
+
+    Returns:
+        columns (list): One array per column, or None when there
+        is no usable cache entry for the file.
+    """
+
+    try:
+        with open(columns_cache_path(file_path), 'rb') as cache_file:
+            header = json.loads(cache_file.readline())
+            if header.get('version') != cache_version or \
+                    header.get('columns') != [list(column)
+                                              for column in column_types]:
+                return None
+
+            columns = []
+            for _, typecode in column_types:
+                column = array.array(typecode)
+                column.fromfile(cache_file, header['rows'])
+                columns.append(column)
+            return columns
+    except (OSError, ValueError, EOFError):
+        return None
+
+
+def write_cache_entry(file_path, column_types, columns, stat, state):
+
+    """
+    This function writes the cache entry of a weather data file:
+    a header line followed by the raw machine values of every column.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+        column_types (list): (column name, array typecode) pairs
+        in the order the columns are stored.
+        columns (list): One array per column.
+        stat (os.stat_result): The status of the file
+        taken before it was parsed.
+        state (dict): Further values to keep in the header, such as
+        the byte offset parsing stopped at and the aggregate.
+
+    Returns:
+        This function does not return anything. Folders that cannot
+        be written to are silently left without a cache.
+    """
+
+    header = dict(state)
+    header.update({
+        'version': cache_version,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'rows': len(columns[0]),
+        'columns': [list(column) for column in column_types],
+    })
+
+    try:
+        cache_dir(os.path.dirname(split_archive_path(file_path)[0]))
+        cache_path = columns_cache_path(file_path)
+        temporary_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(json.dumps(header).encode() + b'\n')
+            for column in columns:
+                column.tofile(cache_file)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass
@@ -0,0 +1,215 @@
+import bisect
+import json
+import os
+import re
+import tarfile
+import zipfile
+
+import weather_cache
+import weather_profile
+
+
+catalog_file_name = 'catalog.json'
+catalog_version = 2
+
+month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+file_name_pattern = re.compile(
+    r'^(?P<station>.+)_weather_(?P<year>\d{4})_(?P<month>[A-Za-z]{3})'
+    r'\.txt(\.gz|\.bz2|\.xz|\.zst)?$')
+
+bundle_extensions = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+loaded_catalogs = {}
+
+
+def parse_file_name(file_name):
+
+    """
+    This function splits the name of a monthly weather data file
+    such as Murree_weather_2004_Aug.txt or Murree_weather_2004_Aug.txt.gz
+    into its parts.
+
+    Parameters:
+        file_name (str): The name of the weather data file.
+
+    Returns:
+        key (tuple): (year, month number, station), or None when
+        the name does not follow the weather data file pattern.
+    """
+
+    match = file_name_pattern.match(file_name)
+    if match is None:
+        return None
+
+    month = match.group('month').capitalize()
+    if month not in month_names:
+        return None
+
+    return (int(match.group('year')), month_names.index(month) + 1,
+            match.group('station'))
+
+
+class WeatherCatalog:
+
+    """
+    A sorted index of the weather data files in a folder, keyed by
+    (year, month, station), that answers which files cover a year
+    or a month with a binary search.
+    """
+
+    def __init__(self, folder_mtime_ns, entries):
+        self.folder_mtime_ns = folder_mtime_ns
+        self.entries = sorted(entries)
+        self.keys = [tuple(entry[:3]) for entry in self.entries]
+
+    def select(self, year, month=None):
+
+        """
+        This method returns the [year, month, station, file name]
+        entries of the files that cover the given year, or a single
+        month of it, in date order.
+
+        Parameters:
+            year (int): The year to look up.
+            month (int): The month number to look up, or None
+            for the whole year.
+
+        Returns:
+            entries (list): The matching entries.
+        """
+
+        year = int(year)
+        if month is None:
+            low = bisect.bisect_left(self.keys, (year,))
+            high = bisect.bisect_left(self.keys, (year + 1,))
+        else:
+            low = bisect.bisect_left(self.keys, (year, int(month)))
+            high = bisect.bisect_left(self.keys, (year, int(month) + 1))
+
+        return self.entries[low:high]
+
+    def files(self, year, month=None):
+        return [entry[3] for entry in self.select(year, month)]
+
+
+def bundle_members(bundle_path):
+
+    """
+    This function lists the files in a zip or tar bundle without
+    extracting them. A bundle that cannot be read has no files.
+
+    Parameters:
+        bundle_path (str): The path to the bundle.
+
+    Returns:
+        member_names (list): The names of the files in the bundle.
+    """
+
+    try:
+        if zipfile.is_zipfile(bundle_path):
+            with zipfile.ZipFile(bundle_path) as bundle:
+                return [info.filename for info in bundle.infolist()
+                        if not info.is_dir()]
+        with tarfile.open(bundle_path) as bundle:
+            return [info.name for info in bundle.getmembers()
+                    if info.isfile()]
+    except (OSError, zipfile.BadZipFile, tarfile.TarError):
+        return []
+
+
+def build_catalog(folder_path):
+
+    """
+    This function parses the name of every file in the given folder
+    once and saves the resulting catalog into the cache folder.
+    Weather data files in zip and tar bundles are listed as well,
+    under the name of the bundle and the name of the file in it
+    joined by weather_cache.archive_separator. A folder that cannot
+    be written to keeps its catalog in memory only.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+
+    Returns:
+        catalog (WeatherCatalog): The new catalog.
+    """
+
+    # made before the folder is stat'ed, since adding it changes the
+    # folder's modification time; read-only folders go without it
+    try:
+        weather_cache.cache_dir(folder_path)
+    except OSError:
+        pass
+    folder_mtime_ns = os.stat(folder_path).st_mtime_ns
+
+    entries = []
+    for file_name in os.listdir(folder_path):
+        if file_name.endswith(bundle_extensions):
+            for member in bundle_members(os.path.join(folder_path,
+                                                      file_name)):
+                key = parse_file_name(os.path.basename(member))
+                if key is not None:
+                    entries.append(list(key) + [
+                        file_name + weather_cache.archive_separator +
+                        member])
+            continue
+
+        key = parse_file_name(file_name)
+        if key is not None:
+            entries.append(list(key) + [file_name])
+    catalog = WeatherCatalog(folder_mtime_ns, entries)
+
+    path = os.path.join(folder_path, weather_cache.cache_folder_name,
+                        catalog_file_name)
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temporary_path, 'w') as catalog_file:
+            json.dump({'version': catalog_version,
+                       'folder_mtime_ns': folder_mtime_ns,
+                       'entries': catalog.entries}, catalog_file)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+    return catalog
+
+
+def load_catalog(folder_path):
+
+    """
+    This function returns the catalog of the given folder. The catalog
+    is reused as long as the modification time of the folder has not
+    changed, which happens whenever files are added, removed or renamed.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+
+    Returns:
+        catalog (WeatherCatalog): The catalog of the folder.
+    """
+
+    with weather_profile.stage('listing'):
+        folder_mtime_ns = os.stat(folder_path).st_mtime_ns
+
+        catalog = loaded_catalogs.get(folder_path)
+        if catalog is None:
+            path = os.path.join(folder_path, weather_cache.cache_folder_name,
+                                catalog_file_name)
+            try:
+                with open(path) as catalog_file:
+                    saved = json.load(catalog_file)
+                if saved.get('version') == catalog_version:
+                    catalog = WeatherCatalog(saved['folder_mtime_ns'],
+                                             saved['entries'])
+            except (OSError, ValueError, KeyError):
+                catalog = None
+
+        if catalog is None or catalog.folder_mtime_ns != folder_mtime_ns:
+            catalog = build_catalog(folder_path)
+
+    loaded_catalogs[folder_path] = catalog
+    return catalog
@@ -0,0 +1,357 @@
+import os
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import weather_catalog
+import weather_profile
+from weather_aggregate import WeatherAggregate
+from weather_func import (
+    collect_aggregates,
+    format_date,
+    load_weather_columns,
+    tree_reduce
+)
+
+
+# at most this many dates are written next to the bars
+max_date_labels = 40
+
+worker_renderer = None
+
+
+def draw_temperature_bars(axes, max_temp, min_temp):
+
+    """
+    This function draws the highest and lowest temperature bars
+    and their labels onto the given axes.
+    """
+
+    axes.barh(['Max Temperature', 'Min Temperature'],
+              [float(max_temp), float(min_temp)],
+              color=['red', 'blue'])
+    axes.set_xlabel('Temperature (°C)')
+    axes.set_ylabel('Temperature Type')
+    axes.set_title('Highest and Lowest Temperatures')
+
+
+def chart_stations(folder_path, months):
+
+    """
+    This function returns the stations that have weather data files
+    for any of the given months, in alphabetical order.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+    return sorted({entry[2] for year, month in months
+                   for entry in catalog.select(year, month)})
+
+
+def month_day_columns(folder_path, months, store=None, station=None):
+
+    """
+    This function gathers the daily dates, highest temperatures and
+    lowest temperatures of the given months from the parsed columns,
+    without going through the values one by one.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        months (list): The (year, month) pairs to gather.
+        store (WeatherStore): An optional store of the folder to read
+        the monthly columns from instead of the weather data files.
+        station (str): The station to gather the days of. The days of
+        every station are gathered one after another when it is None,
+        so it should only be left out for folders of one station.
+
+    Returns:
+        dates (ndarray): The day ordinals.
+        highs (ndarray): The highest temperature of every day.
+        lows (ndarray): The lowest temperature of every day.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+
+    parts = ([], [], [])
+    for year, month in months:
+        entries = catalog.select(year, month)
+        if store is not None:
+            column_sets = store.slices(year, month)
+        else:
+            column_sets = [None] * len(entries)
+        for entry, columns in zip(entries, column_sets):
+            if station is not None and entry[2] != station:
+                continue
+            if columns is None:
+                columns = load_weather_columns(os.path.join(folder_path,
+                                                            entry[3]))
+            for part, column in zip(parts, columns[:3]):
+                part.append(np.asarray(column))
+
+    return tuple(np.concatenate(part) if part else np.empty(0)
+                 for part in parts)
+
+
+def daily_chart_size(day_count):
+    return 8, max(4.8, 0.2 * day_count + 1)
+
+
+def draw_daily_bars(axes, dates, highs, lows, combined=False):
+
+    """
+    This function draws the highest and lowest temperature of every
+    day onto the given axes, one day per row. Each series is drawn
+    with a single barh call. By default every day gets a red bar for
+    its highest and a blue bar for its lowest temperature. With
+    combined set, every day gets a single bar from its lowest to its
+    highest temperature.
+
+    Parameters:
+        axes (Axes): The axes to draw on.
+        dates (ndarray): The day ordinals.
+        highs (ndarray): The highest temperature of every day.
+        lows (ndarray): The lowest temperature of every day.
+        combined (bool): Draw one bar per day instead of two.
+
+    Returns:
+        This function does not return anything.
+    """
+
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    positions = np.arange(len(highs))
+
+    if combined:
+        axes.barh(positions, highs - lows, left=lows, height=0.8,
+                  color='purple', label='Lowest to Highest')
+    else:
+        axes.barh(positions - 0.2, highs, height=0.4, color='red',
+                  label='Highest')
+        axes.barh(positions + 0.2, lows, height=0.4, color='blue',
+                  label='Lowest')
+
+    step = max(1, -(-len(positions) // max_date_labels))
+    axes.set_yticks(positions[::step])
+    axes.set_yticklabels([format_date(int(day)) for day in dates[::step]])
+    axes.set_ylim(len(positions) - 0.5, -0.5)
+    axes.set_xlabel('Temperature (°C)')
+    axes.set_ylabel('Date')
+    axes.set_title('Daily Highest and Lowest Temperatures')
+    axes.legend(loc='lower right')
+
+
+def draw_daily_chart(dates, highs, lows, combined=False, title=None):
+
+    """
+    This function shows the daily chart drawn by draw_daily_bars
+    in a window, sized to the number of days.
+    """
+
+    import matplotlib.pyplot as plt
+
+    with weather_profile.stage('rendering'):
+        _, axes = plt.subplots(figsize=daily_chart_size(len(dates)))
+        draw_daily_bars(axes, dates, highs, lows, combined)
+        if title:
+            axes.set_title(title)
+        plt.tight_layout()
+    plt.show()
+
+
+def draw_station_charts(stations, load_days, combined=False):
+
+    """
+    This function shows the daily chart of every station in turn,
+    each in its own window, so that the days of different stations
+    are not drawn as one series.
+
+    Parameters:
+        stations (list): The station names, or None alone for the
+        days of every station together.
+        load_days (function): Returns the dates, highest and lowest
+        temperatures of a station.
+        combined (bool): See draw_daily_bars.
+
+    Returns:
+        drawn (int): The number of charts shown.
+    """
+
+    drawn = 0
+    for station in stations:
+        dates, highs, lows = load_days(station)
+        if len(dates):
+            draw_daily_chart(dates, highs, lows, combined, station)
+            drawn += 1
+    return drawn
+
+
+def draw_horizontal_bar_chart(max_temp, min_temp):
+    """
+    This function draws a horizontal bar chart
+    to display the highest and lowest temperatures.
+
+    Parameters:
+        max_temp (float): The highest temperature value to be displayed.
+        min_temp (float): The lowest temperature value to be displayed.
+
+    Returns:
+        This function does not return anything.
+        It displays the bar chart using matplotlib.
+    """
+
+    import matplotlib.pyplot as plt
+
+    with weather_profile.stage('rendering'):
+        _, axes = plt.subplots()
+        draw_temperature_bars(axes, max_temp, min_temp)
+    plt.show()
+
+
+class ChartRenderer:
+
+    """
+    Renders charts to image files with the Agg backend, without
+    pyplot. One figure and axes are created up front and cleared
+    between charts instead of building new figure state every time.
+    """
+
+    def __init__(self, width=6.4, height=4.8, dpi=100):
+        self.size = (width, height)
+        self.figure = Figure(figsize=self.size, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self.figure.subplots_adjust(left=0.25)
+
+    def render(self, max_temp, min_temp, title, output_path):
+        with weather_profile.stage('rendering'):
+            self.figure.set_size_inches(*self.size)
+            self.axes.clear()
+            draw_temperature_bars(self.axes, max_temp, min_temp)
+            self.axes.set_title(title)
+            self.figure.savefig(output_path)
+
+    def render_daily(self, dates, highs, lows, combined, title,
+                     output_path):
+
+        """
+        This method renders the daily chart drawn by draw_daily_bars,
+        with the figure sized to the number of days as in
+        draw_daily_chart so that the date labels do not overlap.
+        """
+
+        with weather_profile.stage('rendering'):
+            self.figure.set_size_inches(*daily_chart_size(len(dates)))
+            self.axes.clear()
+            draw_daily_bars(self.axes, dates, highs, lows, combined)
+            self.axes.set_title(title)
+            self.figure.savefig(output_path)
+
+
+def render_month(renderer, folder_path, year, month, output_dir,
+                 image_format, style='daily', station=None):
+
+    """
+    This function renders the chart of one month to a file named
+    weather_YYYY_MM with the extension of the image format, or
+    weather_STATION_YYYY_MM for the chart of a single station.
+
+    Parameters:
+        style (str): 'daily' or 'combined' for the daily bars drawn
+        by draw_daily_bars, or 'summary' for the month's highest and
+        lowest temperature only.
+        station (str): The station to chart, or None for the days of
+        every station, see month_day_columns.
+
+    Returns:
+        output_path (str): The written file, or None when there
+        is no data for the month.
+    """
+
+    name = 'weather_{}_{:02d}.{}'.format(year, month, image_format)
+    if station is not None:
+        name = 'weather_{}_{}'.format(station, name[len('weather_'):])
+    output_path = os.path.join(output_dir, name)
+
+    if style == 'summary':
+        title = 'Highest and Lowest Temperatures {}/{:02d}'.format(
+            year, month)
+        if station is not None:
+            _, highs, lows = month_day_columns(folder_path, [(year, month)],
+                                               station=station)
+            if len(highs) == 0:
+                return None
+            renderer.render(highs.max(), lows.min(),
+                            '{} {}'.format(title, station), output_path)
+            return output_path
+
+        aggregate = tree_reduce(collect_aggregates(folder_path, year, month),
+                                WeatherAggregate.merge, WeatherAggregate())
+        if aggregate.count == 0:
+            return None
+        renderer.render(aggregate.max_temperature.maximum,
+                        aggregate.min_temperature.minimum, title,
+                        output_path)
+        return output_path
+
+    dates, highs, lows = month_day_columns(folder_path, [(year, month)],
+                                           station=station)
+    if len(dates) == 0:
+        return None
+    title = 'Daily Temperatures {}/{:02d}'.format(year, month)
+    if station is not None:
+        title = '{} {}'.format(title, station)
+    renderer.render_daily(dates, highs, lows, style == 'combined', title,
+                          output_path)
+    return output_path
+
+
+def start_worker():
+    global worker_renderer
+    worker_renderer = ChartRenderer()
+
+
+def render_month_in_worker(task):
+    return render_month(worker_renderer, *task)
+
+
+def render_charts(folder_path, months, output_dir, image_format='png',
+                  jobs=1, style='daily', stations=(None,)):
+
+    """
+    This function renders the chart of every given month to an image
+    file without opening any window, so it can run on headless
+    servers. Each process reuses a single figure for all its charts.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        months (list): The (year, month) pairs to render.
+        output_dir (str): The folder to write the images into.
+        image_format (str): 'png' or 'svg'.
+        jobs (int): The number of worker processes.
+        style (str): 'daily', 'combined' or 'summary',
+        see render_month.
+        stations (list): The stations to render a chart of every
+        month for, or None alone for all stations together.
+
+    Returns:
+        output_paths (list): The written files.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(folder_path, year, month, output_dir, image_format, style,
+              station) for station in stations for year, month in months]
+
+    if jobs > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=start_worker) as executor:
+            output_paths = list(executor.map(
+                render_month_in_worker, tasks,
+                chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        renderer = ChartRenderer()
+        output_paths = [render_month(renderer, *task) for task in tasks]
+
+    return [path for path in output_paths if path is not None]
@@ -0,0 +1,387 @@
+import argparse
+import os
+import sqlite3
+from datetime import date
+from itertools import repeat
+from urllib.request import pathname2url
+
+import weather_cache
+import weather_catalog
+from weather_aggregate import ColumnAggregate, WeatherAggregate
+from weather_func import load_weather_columns, stat_weather_file
+
+
+database_file_name = 'weather.db'
+schema_version = 1
+
+# stored in the header of every database ingest_folder writes, 'WTHR'
+# in ASCII, so that it never touches a database it did not create
+application_id = 0x57544852
+
+# rows are handed to executemany in batches of this many
+batch_size = 50000
+
+# columns of the days table, named as the parts of a WeatherAggregate
+report_columns = ['max_temperature', 'min_temperature', 'max_humidity']
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE,
+    station TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS days (
+    file_id INTEGER NOT NULL,
+    station TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    max_temperature REAL NOT NULL,
+    min_temperature REAL NOT NULL,
+    max_humidity INTEGER NOT NULL
+);
+"""
+
+# created once the first load is in, so that it does not have to keep
+# them up to date row by row
+indexes = """
+CREATE INDEX IF NOT EXISTS days_day
+    ON days (day, max_temperature, min_temperature, max_humidity);
+CREATE INDEX IF NOT EXISTS days_station
+    ON days (station, day);
+CREATE INDEX IF NOT EXISTS days_file ON days (file_id);
+"""
+
+
+def database_path(folder_path):
+    return os.path.join(folder_path, weather_cache.cache_folder_name,
+                        database_file_name)
+
+
+def connect(path):
+
+    """
+    This function opens a database written by ingest_folder for
+    reading only, so that a mistyped path is not created as an
+    empty database. A path that is not such a database raises a
+    ValueError saying why.
+
+    Parameters:
+        path (str): The path to the database.
+
+    Returns:
+        connection (sqlite3.Connection): The open database.
+    """
+
+    if os.path.isdir(path):
+        raise ValueError("'{}' is a folder, not a database. Give the "
+                         "folder path before --db, or the path of the "
+                         "database after it.".format(path))
+    if not os.path.isfile(path):
+        raise ValueError("The database '{}' does not exist. Create it "
+                         "with 'weather_report.py ingest'.".format(path))
+    try:
+        connection = sqlite3.connect('file:{}?mode=ro'.format(
+            pathname2url(os.path.abspath(path))), uri=True)
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error as error:
+        raise ValueError("'{}' is not a weather database: {}".format(
+            path, error))
+    if version != schema_version:
+        connection.close()
+        raise ValueError("The database '{}' was written by another "
+                         "version. Ingest the folder again.".format(path))
+    return connection
+
+
+def ingest_folder(folder_path, path):
+
+    """
+    This function loads the complete days of every weather data file
+    in the given folder into a SQLite database, one row per station
+    and day. Files that are already in the database with the same
+    size and modification time are skipped, the rows of changed files
+    are replaced and those of files no longer in the folder removed.
+    Everything is written in a single transaction with executemany,
+    and the indexes on the date and the station are only built after
+    the first load. A database that was not created by this function
+    raises a ValueError and is left as it is.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        path (str): The path to the database, created if missing.
+
+    Returns:
+        counts (dict): The number of files loaded, skipped and removed
+        and the number of rows loaded.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+    counts = {'files': 0, 'unchanged': 0, 'removed': 0, 'rows': 0}
+
+    if os.path.isdir(path):
+        raise ValueError("'{}' is a folder, not a database.".format(path))
+    connection = sqlite3.connect(path)
+    try:
+        check_owner(connection, path)
+        connection.execute('PRAGMA application_id = {}'.format(
+            application_id))
+        if connection.execute('PRAGMA user_version').fetchone()[0] != \
+                schema_version:
+            connection.executescript('DROP TABLE IF EXISTS days;'
+                                     'DROP TABLE IF EXISTS files;')
+        connection.executescript(schema)
+
+        with connection:
+            saved = {file_name: (file_id, size, mtime_ns)
+                     for file_id, file_name, size, mtime_ns
+                     in connection.execute(
+                         'SELECT id, file_name, size, mtime_ns FROM files')}
+
+            batch = []
+            for year, month, station, file_name in catalog.entries:
+                file_path = os.path.join(folder_path, file_name)
+                stat = stat_weather_file(file_path)
+                file_id, size, mtime_ns = saved.pop(file_name,
+                                                    (None, None, None))
+                if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                    counts['unchanged'] += 1
+                    continue
+
+                if file_id is not None:
+                    connection.execute('DELETE FROM days WHERE file_id = ?',
+                                       (file_id,))
+                    connection.execute('DELETE FROM files WHERE id = ?',
+                                       (file_id,))
+                file_id = connection.execute(
+                    'INSERT INTO files (file_name, station, year, month, '
+                    'size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?)',
+                    (file_name, station, year, month, stat.st_size,
+                     stat.st_mtime_ns)).lastrowid
+
+                columns = load_weather_columns(file_path)
+                batch.extend(zip(repeat(file_id), repeat(station), *columns))
+                counts['files'] += 1
+                counts['rows'] += len(columns[0])
+                if len(batch) >= batch_size:
+                    insert_days(connection, batch)
+                    batch = []
+            insert_days(connection, batch)
+
+            for file_id, _, _ in saved.values():
+                connection.execute('DELETE FROM days WHERE file_id = ?',
+                                   (file_id,))
+                connection.execute('DELETE FROM files WHERE id = ?',
+                                   (file_id,))
+                counts['removed'] += 1
+
+        connection.executescript(indexes)
+        connection.execute('PRAGMA user_version = {}'.format(schema_version))
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    return counts
+
+
+def check_owner(connection, path):
+
+    """
+    This function checks that a database opened for writing is empty
+    or was created by ingest_folder. Databases written before the
+    application id was stored are recognised by their version and
+    tables.
+    """
+
+    try:
+        found = connection.execute('PRAGMA application_id').fetchone()[0]
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        tables = {name for name, in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%'")}
+    except sqlite3.Error as error:
+        raise ValueError("'{}' is not a weather database: {}".format(
+            path, error))
+
+    if found == application_id or found == 0 and (
+            not tables and version == 0 or
+            tables == {'files', 'days'} and version == schema_version):
+        return
+    raise ValueError("'{}' was not written by 'weather_report.py ingest' "
+                     "and is left untouched. Give ingest another "
+                     "path.".format(path))
+
+
+def insert_days(connection, rows):
+    connection.executemany(
+        'INSERT INTO days (file_id, station, day, max_temperature, '
+        'min_temperature, max_humidity) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+
+def day_range(year, month=None):
+    year = int(year)
+    if month is None:
+        return (date(year, 1, 1).toordinal(),
+                date(year, 12, 31).toordinal())
+    month = int(month)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, 1).toordinal(), following.toordinal() - 1
+
+
+def query_aggregates(connection, year, month=None, by_station=False):
+
+    """
+    This function builds the aggregates of a year, or a single month
+    of it, with SQL aggregates over the date index. The dates of the
+    extremes are looked up with two more indexed queries per column,
+    taking the earliest of the days that share an extreme value as
+    the other backends do.
+
+    Returns:
+        aggregates (dict): The WeatherAggregate of every station, by
+        station name in alphabetical order, or of all stations
+        together under None when by_station is not set.
+    """
+
+    first, last = day_range(year, month)
+    group = 'station' if by_station else 'NULL'
+    selected = ', '.join(
+        'SUM({0}), SUM({0} * {0}), MIN({0}), MAX({0})'.format(column)
+        for column in report_columns)
+
+    aggregates = {}
+    for row in connection.execute(
+            'SELECT {0}, COUNT(*), {1} FROM days WHERE day BETWEEN ? AND ? '
+            'GROUP BY {0} ORDER BY {0}'.format(group, selected),
+            (first, last)):
+        aggregate = WeatherAggregate()
+        for number, column in enumerate(report_columns):
+            column_aggregate = ColumnAggregate()
+            column_aggregate.count = row[1]
+            (column_aggregate.total, column_aggregate.total_squares,
+             column_aggregate.minimum,
+             column_aggregate.maximum) = row[2 + number * 4:6 + number * 4]
+
+            for extreme in ('minimum', 'maximum'):
+                condition = 'day BETWEEN ? AND ? AND {} = ?'.format(column)
+                values = [first, last, getattr(column_aggregate, extreme)]
+                if by_station:
+                    condition += ' AND station = ?'
+                    values.append(row[0])
+                setattr(column_aggregate, extreme + '_date',
+                        connection.execute(
+                            'SELECT MIN(day) FROM days WHERE ' + condition,
+                            values).fetchone()[0])
+            setattr(aggregate, column, column_aggregate)
+        aggregates[row[0]] = aggregate
+    return aggregates
+
+
+def database_aggregates(connection, year, month=None):
+
+    """
+    This function returns the aggregate of all stations for the given
+    year, or a single month of it, in the list form collect_aggregates
+    returns.
+
+    Parameters:
+        connection (sqlite3.Connection): The database opened by connect.
+        year (int): The year to collect.
+        month (int): The month number to collect, or None
+        for the whole year.
+
+    Returns:
+        aggregates (list): A single WeatherAggregate, or none when
+        there is no data.
+    """
+
+    return list(query_aggregates(connection, year, month).values())
+
+
+def station_aggregates(connection, year, month=None):
+    return query_aggregates(connection, year, month, by_station=True)
+
+
+def stations(connection, months):
+
+    """
+    This function returns the stations with days in any of the given
+    months, in alphabetical order.
+    """
+
+    names = set()
+    for year, month in months:
+        names.update(station for station, in connection.execute(
+            'SELECT DISTINCT station FROM days WHERE day BETWEEN ? AND ?',
+            day_range(year, month)))
+    return sorted(names)
+
+
+def day_columns(connection, months, station=None):
+
+    """
+    This function gathers the daily dates, highest temperatures and
+    lowest temperatures of the given months for the daily charts, in
+    the order weather_chart.month_day_columns reads them from the
+    files: month by month, and station by station within a month.
+
+    Parameters:
+        connection (sqlite3.Connection): The database opened by connect.
+        months (list): The (year, month) pairs to gather.
+        station (str): The station to gather the days of, or None
+        for every station.
+
+    Returns:
+        dates (list): The day ordinals.
+        highs (list): The highest temperature of every day.
+        lows (list): The lowest temperature of every day.
+    """
+
+    condition = 'day BETWEEN ? AND ?'
+    if station is not None:
+        condition += ' AND station = ?'
+    dates, highs, lows = [], [], []
+    for year, month in months:
+        values = day_range(year, month)
+        if station is not None:
+            values += (station,)
+        for day, high, low in connection.execute(
+                'SELECT day, max_temperature, min_temperature FROM days '
+                'WHERE {} ORDER BY station, day'.format(condition), values):
+            dates.append(day)
+            highs.append(high)
+            lows.append(low)
+    return dates, highs, lows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="weather_report.py ingest",
+                                     description="Load weather data \
+        files into a SQLite database for the --db flag")
+    parser.add_argument("folder_path", help="Path to \
+        the folder containing weather data files.")
+    parser.add_argument("database_path", nargs="?", help="Database to \
+        load the files into. Defaults to weather.db in the cache folder \
+            of folder_path.")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.folder_path):
+        print("Error: The folder path '{}' does not "
+              "exist.".format(args.folder_path))
+        return
+
+    path = args.database_path
+    if path is None:
+        weather_cache.cache_dir(args.folder_path)
+        path = database_path(args.folder_path)
+    try:
+        counts = ingest_folder(args.folder_path, path)
+    except ValueError as error:
+        print("Error: {}".format(error))
+        return
+    print("Loaded {} files with {} rows into '{}', {} unchanged, "
+          "{} removed".format(counts['files'], counts['rows'], path,
+                              counts['unchanged'], counts['removed']))
@@ -1,10 +1,454 @@
-import csv
+import array
+import bz2
+import gzip
+import io
+import lzma
 import os
-import matplotlib.pyplot as plt
-from datetime import datetime
+import tarfile
+import zipfile
+from datetime import date
 
+import weather_cache
+import weather_catalog
+import weather_metrics
+import weather_profile
+from weather_aggregate import WeatherAggregate
 
-def process_weather_data(file_path):
+
+highest_temperature = 'Max TemperatureC'
+lowest_temperature = 'Min TemperatureC'
+highest_humidity = 'Max Humidity'
+
+column_types = [
+    ('Date', 'i'),
+    (highest_temperature, 'd'),
+    (lowest_temperature, 'd'),
+    (highest_humidity, 'i')]
+
+# bytes kept from before the resume offset to detect rewritten files
+tail_size = 32
+
+compressed_extensions = ('.gz', '.bz2', '.xz', '.zst')
+
+
+def parse_date(date_text):
+
+    """
+    This function converts a date such as 2004-8-1 from
+    a weather data file to its day ordinal.
+
+    Parameters:
+        date_text (str or bytes): The date in the format YYYY-M-D.
+
+    Returns:
+        day_ordinal (int): The proleptic Gregorian ordinal of the date.
+    """
+
+    year, month, day = date_text.split(
+        b'-' if isinstance(date_text, bytes) else '-')
+    return date(int(year), int(month), int(day)).toordinal()
+
+
+def format_date(day_ordinal):
+    return date.fromordinal(day_ordinal).isoformat()
+
+
+def open_weather_file(file_path, data=None):
+
+    """
+    This function opens a weather data file for reading in binary
+    mode, or wraps its contents when they have already been read.
+    Files compressed with gzip, bzip2, xz or zstd, and files in zip
+    or tar bundles, are decompressed as they are read, so only the
+    current buffer is ever held in memory. zstd needs the zstandard
+    package, which is only imported for .zst files.
+
+    Parameters:
+        file_path (str): The path to the weather data file.
+        data (bytes): The contents of the file, if already read,
+        decompressed.
+
+    Returns:
+        file (file): A binary file object, wrapped in a
+        weather_profile.ProfiledFile while a profile is active, unless
+        data was given, as it has then been read and counted already.
+    """
+
+    profile = weather_profile.current()
+    if profile is None or data is not None:
+        return open_file(file_path, data)
+
+    previous = profile.switch('reading')
+    try:
+        file = open_file(file_path, data)
+    finally:
+        profile.switch(previous)
+    profile.counts['files'] += 1
+    return weather_profile.ProfiledFile(file, profile)
+
+
+def open_file(file_path, data=None):
+    if data is not None:
+        return io.BytesIO(data)
+
+    path, member = weather_cache.split_archive_path(file_path)
+    if member is not None:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return archive.open(member)
+        return TarMemberFile(tarfile.open(path), member)
+
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rb')
+    if file_path.endswith('.bz2'):
+        return bz2.open(file_path, 'rb')
+    if file_path.endswith('.xz'):
+        return lzma.open(file_path, 'rb')
+    if file_path.endswith('.zst'):
+        import zstandard
+        return io.BufferedReader(zstandard.open(file_path, 'rb'))
+    return open(file_path, 'rb')
+
+
+class TarMemberFile(tarfile.ExFileObject):
+
+    """
+    A file in a tar bundle, read in place, that closes the bundle
+    when it is closed itself.
+    """
+
+    def __init__(self, archive, member):
+        self.archive = archive
+        try:
+            super().__init__(archive, archive.getmember(member))
+        except KeyError:
+            archive.close()
+            raise FileNotFoundError(member)
+
+    def close(self):
+        super().close()
+        self.archive.close()
+
+
+def stat_weather_file(file_path):
+    return os.stat(weather_cache.split_archive_path(file_path)[0])
+
+
+def is_plain_file(file_path):
+
+    """
+    This function tells whether a weather data file is stored as is,
+    so that its byte offsets are those of the file on disk and rows
+    appended to it can be read on their own.
+    """
+
+    return weather_cache.split_archive_path(file_path)[1] is None and \
+        not file_path.endswith(compressed_extensions)
+
+
+def iter_weather_rows(file_path, position=None, data=None):
+
+    """
+    This function reads a weather data file one row at a time
+    and yields the date, highest temperature, lowest temperature
+    and highest humidity of every day that has all three values.
+    Lines are read as bytes and only split up to the last needed
+    column, so the remaining columns of a row are never turned into
+    separate strings. The weather data files never quote fields,
+    so no CSV quoting rules are applied.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+        position (dict): Optional. When it holds an 'offset' and the
+        header column 'indexes' of the file, reading starts at that
+        byte offset instead of at the header, and the 'missing' counts
+        and 'days' index it holds are carried on. Once the rows have
+        been read it is updated with the offset of the end of the file,
+        or None when the file does not end with a complete line or is
+        compressed, the header column indexes, the last bytes before
+        the offset so that a later read can check that they are
+        unchanged, the number of empty highest temperature, lowest
+        temperature and highest humidity cells in 'missing', the
+        number of rows this read skipped as cut short or incomplete
+        in 'skipped', and the date metadata described in day_index.
+        data (bytes): The contents of the file, if already read.
+
+    Returns:
+        A generator of (day_ordinal, max_temperature, min_temperature,
+        max_humidity) tuples. Only the current row is held in memory.
+    """
+
+    if position is None:
+        position = {}
+
+    with open_weather_file(file_path, data) as file:
+        indexes = position.get('indexes')
+        if position.get('offset') and indexes:
+            file.seek(position['offset'])
+        else:
+            indexes = None
+            position['missing'] = position['days'] = None
+
+        if indexes is None:
+            indexes = read_header_indexes(
+                file,
+                [highest_temperature, lowest_temperature, highest_humidity])
+            if indexes is None:
+                position.update(offset=None, indexes=None, tail='',
+                                missing=[0, 0, 0], days=[], ordered=True,
+                                first_date=None, last_date=None)
+                return
+
+        (highest_temperature_index,
+         lowest_temperature_index,
+         highest_humidity_index) = indexes
+        last_column = max(indexes)
+        missing = list(position.get('missing') or [0, 0, 0])
+        days = list(position.get('days') or [])
+        ordered = position.get('ordered', True) if days else True
+        last_day = days[-1][0] if days else None
+        skipped = 0
+        offset = file.tell()
+        profile = weather_profile.current()
+        if profile is not None:
+            outer = profile.stage
+
+        for line in file:
+            if profile is not None:
+                profile.switch('tokenizing')
+                profile.counts['rows'] += 1
+            start = offset
+            offset += len(line)
+            fields = line.rstrip(b'\r\n').split(b',', last_column + 1)
+            if len(fields) <= last_column:
+                skipped += 1
+                if profile is not None:
+                    profile.counts['skipped'] += 1
+                continue
+
+            if profile is not None:
+                profile.switch('converting')
+            day = parse_date(fields[0])
+            if day != last_day:
+                if last_day is not None and day < last_day:
+                    ordered = False
+                days.append([day, start])
+                last_day = day
+
+            if not (fields[highest_temperature_index] and
+                    fields[lowest_temperature_index] and
+                    fields[highest_humidity_index]):
+                for number, index in enumerate(indexes):
+                    if not fields[index]:
+                        missing[number] += 1
+                skipped += 1
+                if profile is not None:
+                    profile.counts['skipped'] += 1
+                continue
+            row = (day,
+                   float(fields[highest_temperature_index]),
+                   float(fields[lowest_temperature_index]),
+                   int(fields[highest_humidity_index]))
+            if profile is not None:
+                profile.switch(outer)
+            yield row
+
+        if profile is not None:
+            profile.switch(outer)
+        end = file.tell()
+        tail = b''
+        if data is not None or is_plain_file(file_path):
+            file.seek(max(0, end - tail_size))
+            tail = file.read(end - file.tell())
+
+    position.update(offset=end if tail.endswith(b'\n') else None,
+                    indexes=indexes, tail=tail.hex(), missing=missing,
+                    skipped=skipped, days=days, ordered=ordered,
+                    first_date=min(days)[0] if days else None,
+                    last_date=max(days)[0] if days else None)
+
+
+def day_index(file_path):
+
+    """
+    This function returns the date metadata of a weather data file,
+    kept in the header of its cache entry, parsing the file first
+    if the entry is missing or out of date. Every row with all of
+    the report columns, empty or not, is counted as a dated row.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        metadata (dict): The 'first_date' and 'last_date' of the dated
+        rows as day ordinals, or None when there are none, the number
+        of complete 'rows', and the 'days' index: a [day ordinal, byte
+        offset] pair for the first row of every run of rows with the
+        same date. 'ordered' tells whether the dates never go
+        backwards, which is when the offsets can be used for seeking.
+    """
+
+    metadata = {}
+    update_weather_cache(file_path, with_columns=False, state=metadata)
+    return metadata
+
+
+def read_header_indexes(file, column_names):
+
+    """
+    This function reads the header line of a weather data file
+    opened in binary mode and finds the given columns in it.
+    Blank lines before the header are skipped.
+
+    Parameters:
+        file (file): The weather data file, positioned at its start.
+        column_names (list): The names of the columns to find.
+
+    Returns:
+        indexes (list): The index of every column, or None when
+        the file has no header.
+    """
+
+    for line in file:
+        if line.strip():
+            header = [name.strip()
+                      for name in line.decode('utf-8').split(',')]
+            return [header.index(name) for name in column_names]
+    return None
+
+
+def file_tail(file_path, offset, data=None):
+    with open_weather_file(file_path, data) as file:
+        file.seek(max(0, offset - tail_size))
+        return file.read(offset - file.tell()).hex()
+
+
+def update_weather_cache(file_path, with_columns=True, data=None, stat=None,
+                         state=None, header=None):
+
+    """
+    This function brings the cache entry of a weather data file
+    up to date and returns its aggregate and columns. An unchanged
+    file is not read at all. An uncompressed file that has grown past
+    the offset the entry was parsed up to, and whose last tail_size
+    bytes before that offset are unchanged, is taken to have had rows
+    appended: only the bytes after the offset are parsed and merged
+    into the stored aggregate and columns. The earlier bytes are not
+    compared, so a rewrite that grows the file and keeps those tail
+    bytes is also treated as an append and its earlier changes are
+    missed. Any other change, including a rewrite that keeps the size
+    of the file, parses the whole file again. A file in a bundle
+    counts as changed whenever the bundle changes.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+        with_columns (bool): Whether the columns are needed. An
+        unchanged file then only has the header of its entry read.
+        data (bytes): The contents of the file, if already read.
+        stat (os.stat_result): The status of the file taken before
+        data was read, if already known.
+        state (dict): Optional. Updated with the values kept in the
+        header of the cache entry, such as the 'missing' counts.
+        header (dict): The header of the cache entry read along with
+        stat, if already read.
+
+    Returns:
+        aggregate (WeatherAggregate): The aggregate of the file.
+        columns (list): One array per entry of column_types,
+        or None when with_columns is not set.
+    """
+
+    if stat is None:
+        stat = stat_weather_file(file_path)
+    if header is None:
+        with weather_profile.stage('reading'):
+            header = weather_cache.read_cache_header(file_path,
+                                                     column_types)
+    columns = None
+
+    if header is not None and weather_cache.is_current(header, stat):
+        aggregate = WeatherAggregate.from_list(header['aggregate'])
+        if with_columns:
+            with weather_profile.stage('reading'):
+                columns = weather_cache.read_cached_columns(file_path,
+                                                            column_types)
+        if columns is not None or not with_columns:
+            profile = weather_profile.current()
+            if profile is not None:
+                profile.counts['cached'] += 1
+            if weather_metrics.active is not None:
+                weather_metrics.active.count('files_cached')
+            if state is not None:
+                state.update(header)
+            return aggregate, columns
+
+    position = {}
+    if header is not None and header.get('offset') and \
+            is_plain_file(file_path) and \
+            stat.st_size > header['offset'] and \
+            file_tail(file_path, header['offset'], data) == header['tail']:
+        columns = weather_cache.read_cached_columns(file_path, column_types)
+        if columns is not None:
+            aggregate = WeatherAggregate.from_list(header['aggregate'])
+            position = {'offset': header['offset'],
+                        'indexes': header['indexes'],
+                        'missing': header['missing'],
+                        'days': header['days'],
+                        'ordered': header['ordered']}
+
+    if not position:
+        aggregate = WeatherAggregate()
+        columns = [array.array(typecode) for _, typecode in column_types]
+
+    new_columns = [array.array(typecode) for _, typecode in column_types]
+    with weather_profile.stage('converting'):
+        for row in iter_weather_rows(file_path, position, data):
+            for column, value in zip(new_columns, row):
+                column.append(value)
+
+    with weather_profile.stage('aggregating'):
+        aggregate = aggregate.merge(
+            WeatherAggregate.from_columns(new_columns))
+    for column, new_column in zip(columns, new_columns):
+        column.extend(new_column)
+
+    skipped = position.pop('skipped', 0)
+    if weather_metrics.active is not None:
+        weather_metrics.active.count('files_parsed')
+        weather_metrics.active.count('rows_parsed', len(new_columns[0]))
+        weather_metrics.active.count('parse_errors', skipped)
+
+    position['aggregate'] = aggregate.to_list()
+    weather_cache.write_cache_entry(file_path, column_types, columns, stat,
+                                    position)
+    if state is not None:
+        state.update(position, rows=len(columns[0]))
+    return aggregate, columns
+
+
+def load_weather_columns(file_path):
+
+    """
+    This function returns the date, highest temperature,
+    lowest temperature and highest humidity columns of a
+    weather data file as compact typed arrays, read from the
+    cache where possible.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        columns (list): One array per entry of column_types.
+    """
+
+    return update_weather_cache(file_path)[1]
+
+
+def process_weather_data(file_path, backend='python'):
 
     """
     This function process weather data from a CSV file
@@ -14,6 +458,8 @@ def process_weather_data(file_path):
     Parameters:
         file_path (str): The path to the CSV
         file containing weather data files.
+        backend (str): 'python' to use the cached columns,
+        or 'numpy' to parse the file with NumPy.
 
     Returns:
              max_temperature_value (float): \
@@ -28,53 +474,300 @@ def process_weather_data(file_path):
              max_humidity_date (str): The date corresponding \
                  to the maximum humidity.
     """
-    date_format = '%Y-%m-%d'
-    data_list = []
 
-    with open(file_path, 'r') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            data_list.append(row)
+    return aggregate_extrema(aggregate_function(backend)(file_path))
+
+
+def file_aggregate(file_path):
+
+    """
+    This function builds the mergeable aggregate of the highest
+    temperature, lowest temperature and highest humidity columns
+    of a weather data file.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        aggregate (WeatherAggregate): The aggregate of the file.
+    """
+
+    return update_weather_cache(file_path, with_columns=False)[0]
+
+
+def aggregate_function(backend):
+
+    """
+    This function returns the function that builds the aggregate of
+    a single file for the given backend. NumPy is only imported when
+    the 'numpy' backend is used.
+    """
+
+    if backend == 'numpy':
+        import weather_numpy
+        return weather_numpy.file_aggregate
+    if backend == 'python':
+        return file_aggregate
+    raise ValueError('Unknown backend: {}'.format(backend))
+
+
+def aggregate_extrema(aggregate):
+
+    """
+    This function turns an aggregate into the values returned by
+    process_weather_data, with the dates formatted as YYYY-MM-DD.
+    The values are None when the aggregate is empty.
+    """
+
+    if aggregate.count == 0:
+        return (None, '') * 3
+
+    return (aggregate.max_temperature.maximum,
+            format_date(aggregate.max_temperature.maximum_date),
+            aggregate.min_temperature.minimum,
+            format_date(aggregate.min_temperature.minimum_date),
+            aggregate.max_humidity.maximum,
+            format_date(aggregate.max_humidity.maximum_date))
+
+
+def tree_reduce(values, merge, empty):
+
+    """
+    This function combines a list of partial results by merging
+    neighbours pairwise, level by level, so the depth of the
+    reduction grows with the logarithm of the number of results.
+
+    Parameters:
+        values (list): The partial results in order.
+        merge (function): Combines two partial results.
+        empty: The result to return when there are no values.
+
+    Returns:
+        The combined result.
+    """
+
+    values = list(values)
+    if not values:
+        return empty
+
+    with weather_profile.stage('aggregating'):
+        while len(values) > 1:
+            merged = [merge(values[index], values[index + 1])
+                      for index in range(0, len(values) - 1, 2)]
+            if len(values) % 2:
+                merged.append(values[-1])
+            values = merged
+    return values[0]
+
+
+def collect_aggregates(folder_path, year, month=None, store=None, jobs=1,
+                       backend='python', io_concurrency=0, rollup=None,
+                       dataset=None):
+
+    """
+    This function builds the aggregate of every weather data file
+    that covers the given year, or a single month of it.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        year (int): The year to collect.
+        month (int): The month number to collect, or None
+        for the whole year.
+        store (WeatherStore): An optional store of the folder to read
+        the monthly columns from instead of the weather data files.
+        jobs (int): The number of worker processes used
+        to process the files.
+        backend (str): 'python' or 'numpy', see process_weather_data.
+        io_concurrency (int): When set, the files are read with asyncio
+        keeping up to this many reads in flight, and are parsed with
+        the Python backend.
+        rollup (WeatherRollup): An optional rollup of the folder to take
+        the monthly aggregates from without opening any file.
+        dataset (pyarrow.dataset.Dataset): An optional Parquet dataset
+        written by 'weather_report.py convert' to read instead of the
+        weather data files.
+
+    Returns:
+        aggregates (list): One WeatherAggregate per file, in date order,
+        or a single one for a dataset.
+    """
+
+    if dataset is not None:
+        import weather_arrow
+        return weather_arrow.dataset_aggregates(dataset, year, month)
+
+    if store is not None:
+        return [WeatherAggregate.from_columns(columns)
+                for columns in store.slices(year, month)]
+
+    if rollup is not None:
+        return rollup.aggregates(year, month)
+
+    catalog = weather_catalog.load_catalog(folder_path)
+    file_paths = [os.path.join(folder_path, file_name)
+                  for file_name in catalog.files(year, month)]
+
+    if io_concurrency > 0:
+        import weather_async
+        return weather_async.collect_file_aggregates(file_paths,
+                                                     io_concurrency)
+
+    aggregate_file = aggregate_function(backend)
+
+    if jobs > 1 and len(file_paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunk_size = max(1, len(file_paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return weather_metrics.map_counted(executor, aggregate_file,
+                                               file_paths,
+                                               chunksize=chunk_size)
+
+    return [aggregate_file(file_path) for file_path in file_paths]
+
+
+def station_aggregate(file_paths, backend='python'):
+
+    """
+    This function reduces the files of one station to a single
+    aggregate. It is the unit of work of collect_station_aggregates,
+    so a worker process sends back one aggregate per station
+    instead of one per file.
+    """
+
+    aggregate_file = aggregate_function(backend)
+    return tree_reduce([aggregate_file(file_path) for file_path in file_paths],
+                       WeatherAggregate.merge, WeatherAggregate())
+
+
+def collect_station_aggregates(folder_path, year, month=None, jobs=1,
+                               backend='python', io_concurrency=0,
+                               rollup=None, dataset=None):
+
+    """
+    This function builds the aggregate of every station for the given
+    year, or a single month of it, in one sweep over the folder. The
+    files are partitioned by the station in their names, and with
+    several jobs every worker process reduces whole stations.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        year (int): The year to collect.
+        month (int): The month number to collect, or None
+        for the whole year.
+        jobs (int): The number of worker processes.
+        backend (str): 'python' or 'numpy', see process_weather_data.
+        io_concurrency (int): The most file reads kept in flight,
+        see collect_aggregates.
+        rollup (WeatherRollup): An optional rollup of the folder,
+        see collect_aggregates.
+        dataset (pyarrow.dataset.Dataset): An optional Parquet dataset
+        to group by its station column instead.
+
+    Returns:
+        station_aggregates (dict): The WeatherAggregate of every
+        station, by station name in alphabetical order.
+    """
+
+    if dataset is not None:
+        import weather_arrow
+        return weather_arrow.dataset_station_aggregates(dataset, year,
+                                                        month)
+
+    if rollup is not None:
+        entries = rollup.months(year, month)
+    else:
+        entries = weather_catalog.load_catalog(folder_path).select(year,
+                                                                   month)
+
+    partitions = {}
+    for entry in entries:
+        partitions.setdefault(entry[2], []).append(entry)
+    stations = sorted(partitions)
+
+    if rollup is not None:
+        aggregates = [tree_reduce([WeatherAggregate.from_list(entry[6])
+                                   for entry in partitions[station]],
+                                  WeatherAggregate.merge, WeatherAggregate())
+                      for station in stations]
+        return dict(zip(stations, aggregates))
+
+    path_partitions = [[os.path.join(folder_path, entry[3])
+                        for entry in partitions[station]]
+                       for station in stations]
+
+    if io_concurrency > 0:
+        import weather_async
+        file_aggregates = iter(weather_async.collect_file_aggregates(
+            [path for paths in path_partitions for path in paths],
+            io_concurrency))
+        aggregates = [tree_reduce([next(file_aggregates) for _ in paths],
+                                  WeatherAggregate.merge, WeatherAggregate())
+                      for paths in path_partitions]
+    elif jobs > 1 and len(stations) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunk_size = max(1, len(stations) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            aggregates = weather_metrics.map_counted(
+                executor, station_aggregate, path_partitions,
+                [backend] * len(stations), chunksize=chunk_size)
+    else:
+        aggregates = [station_aggregate(paths, backend)
+                      for paths in path_partitions]
+
+    return dict(zip(stations, aggregates))
 
-    highest_temperature = 'Max TemperatureC'
-    highest_temperature_index = data_list[0].index(highest_temperature)
 
-    lowest_temperature = 'Min TemperatureC'
-    lowest_temperature_index = data_list[0].index(lowest_temperature)
+def print_station_report(station_aggregates, print_report):
+
+    """
+    This function prints a report for every station followed by the
+    same report for the whole network of stations. For the network
+    extremes the station they were recorded at is printed as well.
 
-    highest_humidity = 'Max Humidity'
-    highest_humidity_index = data_list[0].index(highest_humidity)
+    Parameters:
+        station_aggregates (dict): The WeatherAggregate of every
+        station, as returned by collect_station_aggregates.
+        print_report (function): print_year_report or
+        print_average_report.
 
-    columns_to_check = [
-        highest_temperature_index,
-        lowest_temperature_index,
-        highest_humidity_index]
+    Returns:
+        This function does not return anything. It prints the reports.
+    """
 
-    data_list = [row for row in data_list if all(row[col]
-                 for col in columns_to_check)]
+    for station, aggregate in station_aggregates.items():
+        print('{}:'.format(station))
+        print_report(aggregate)
+        print()
 
-    max_temperature_value = max([float(each_row[highest_temperature_index])
-                                 for each_row in data_list[1:]])
-    max_temperature_date = datetime.strptime
-    (data_list[max_temperature_value_index + 1][0], date_format)
+    network = tree_reduce(list(station_aggregates.values()),
+                          WeatherAggregate.merge, WeatherAggregate())
+    print('All Stations ({}):'.format(len(station_aggregates)))
+    print_report(network)
+    if network.count == 0 or print_report is not print_year_report:
+        return
 
-    min_temperature_value = min([float(each_row
-                                       [lowest_temperature_index])
-                                 for each_row in data_list[1:]])
-    min_temperature_date = datetime.strptime
-    (data_list[min_temperature_value_index + 1][0], date_format)
+    for label, name, extreme in (
+            ('Highest Temperature', 'max_temperature', 'maximum'),
+            ('Lowest Temperature', 'min_temperature', 'minimum'),
+            ('Highest Humidity', 'max_humidity', 'maximum')):
+        record = extreme_record(getattr(network, name), extreme)
+        stations = [station
+                    for station, aggregate in station_aggregates.items()
+                    if extreme_record(getattr(aggregate, name),
+                                      extreme) == record]
+        print('{} recorded at: {}'.format(label, ', '.join(stations)))
 
-    max_humidity_value = max([int(each_row[highest_humidity_index])
-                              for each_row in data_list[1:]])
-    max_humidity_date = datetime.strptime
-    (data_list[max_humidity_value_index + 1][0], date_format)
 
-    return (max_temperature_value, max_temperature_date,
-            min_temperature_value, min_temperature_date,
-            max_humidity_value, max_humidity_date)
+def extreme_record(column, extreme):
+    return getattr(column, extreme), getattr(column, extreme + '_date')
 
 
-def process_all_files_in_folder(folder_path, year):
+def process_all_files_in_folder(folder_path, year, store=None, jobs=1,
+                                backend='python', io_concurrency=0,
+                                rollup=None, by_station=False, dataset=None):
 
     """
     This function process all weather data files in
@@ -86,37 +779,65 @@ def process_all_files_in_folder(folder_path, year):
         folder_path (str): The path to the folder
         containing weather data files.
         year (int): The year for which weather data is to be processed.
+        store (WeatherStore): An optional store of the folder to read
+        the monthly columns from instead of the weather data files.
+        jobs (int): The number of worker processes used
+        to process the files.
+        backend (str): 'python' or 'numpy', see process_weather_data.
+        io_concurrency (int): The most file reads kept in flight,
+        see collect_aggregates.
+        rollup (WeatherRollup): An optional rollup of the folder,
+        see collect_aggregates.
+        by_station (bool): Report every station on its own before
+        the whole network, see collect_station_aggregates.
+        dataset (pyarrow.dataset.Dataset): An optional Parquet dataset,
+        see collect_aggregates.
 
     Returns:
         This function does not return anything.
         It prints the results and draws a horizontal bar chart.
     """
 
-    max_temp_all_files = float()
-    max_temp_date = ''
-    min_temp_all_files = float()
-    min_temp_date = ''
-    max_humidity_all_files = 0
-    max_humidity_date = ''
+    with weather_metrics.measure('year'):
+        if by_station:
+            print_station_report(
+                collect_station_aggregates(folder_path, year, jobs=jobs,
+                                           backend=backend,
+                                           io_concurrency=io_concurrency,
+                                           rollup=rollup, dataset=dataset),
+                print_year_report)
+            return
 
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.txt') and str(year) in file_name:
-            file_path = os.path.join(folder_path, file_name)
-    (max_temp, max_temp_date_curr,
-     min_temp, min_temp_date_curr,
-     max_humidity, max_humidity_date_curr) = process_weather_data(file_path)
+        aggregate = tree_reduce(
+            collect_aggregates(folder_path, year, store=store, jobs=jobs,
+                               backend=backend,
+                               io_concurrency=io_concurrency,
+                               rollup=rollup, dataset=dataset),
+            WeatherAggregate.merge, WeatherAggregate())
+        print_year_report(aggregate)
 
-    if max_temp > max_temp_all_files:
-        max_temp_all_files = max_temp
-        max_temp_date = max_temp_date_curr
 
-    if min_temp < min_temp_all_files:
-        min_temp_all_files = min_temp
-        min_temp_date = min_temp_date_curr
+def print_year_report(aggregate):
 
-    if max_humidity > max_humidity_all_files:
-        max_humidity_all_files = max_humidity
-        max_humidity_date = max_humidity_date_curr
+    """
+    This function prints the highest temperature, lowest temperature
+    and highest humidity of a year along with their dates.
+
+    Parameters:
+        aggregate (WeatherAggregate): The aggregate of the year.
+
+    Returns:
+        This function does not return anything. It prints the results.
+    """
+
+    if aggregate.count == 0:
+        print("No data found for the given year.")
+        return
+
+    (max_temp_all_files, max_temp_date,
+     min_temp_all_files, min_temp_date,
+     max_humidity_all_files, max_humidity_date) = \
+        aggregate_extrema(aggregate)
 
     print('Highest Temperature:', max_temp_all_files, "C on", max_temp_date)
     print('Lowest Temperature:', min_temp_all_files, "C on", min_temp_date)
@@ -124,12 +845,22 @@ def process_all_files_in_folder(folder_path, year):
           max_humidity_date)
 
 
-def calculate_average_values(folder_path, year, month):
+months = {
+    '01': "Jan", '02': "Feb", '03': "Mar",
+    '04': "Apr", '05': "May", '06': "Jun",
+    '07': "Jul", '08': "Aug", '09': "Sep",
+    '10': "Oct", '11': "Nov", '12': "Dec"
+         }
+
+
+def calculate_average_weather_data(folder_path, year, month, store=None,
+                                   backend='python', io_concurrency=0,
+                                   rollup=None, by_station=False, jobs=1,
+                                   dataset=None):
 
     """
     This function calculates average values of highest
     temperature, lowest temperature, and humidity
-
     for a specific year and month from
     weather data files in the given folder.
 
@@ -137,62 +868,111 @@ def calculate_average_values(folder_path, year, month):
         folder_path (str): The path to the folder
         containing weather data files.
         year (int): The year for which average values are to be calculated.
+        month (str): The month in the format MM.
+        store (WeatherStore): An optional store of the folder to read
+        the monthly columns from instead of the weather data files.
+        backend (str): 'python' or 'numpy', see process_weather_data.
+        io_concurrency (int): The most file reads kept in flight,
+        see collect_aggregates.
+        rollup (WeatherRollup): An optional rollup of the folder,
+        see collect_aggregates.
+        by_station (bool): Report every station on its own before
+        the whole network, see collect_station_aggregates.
+        jobs (int): The number of worker processes used with
+        by_station.
+        dataset (pyarrow.dataset.Dataset): An optional Parquet dataset,
+        see collect_aggregates.
 
     Returns:
         This function does not return anything. It prints the average values.
     """
 
-
-months = {
-    '01': "Jan", '02': "Feb", '03': "Mar",
-    '04': "Apr", '05': "May", '06': "Jun",
-    '07': "Jul", '08': "Aug", '09': "Sep",
-    '10': "Oct", '11': "Nov", '12': "Dec"
-         }
-
-
-def calculate_average_weather_data(folder_path, year, month):
     if month in months:
-        month = months[month]
+        month_number = int(month)
     else:
         print("Invalid month format. Please enter a valid month"
               "in the format MM.")
         return
 
-    # Implement the average value calculation here
-    total_high_temp = 0
-    total_low_temp = 0
-    total_humidity = 0
-    count = 0
-
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.txt') and str(year) in file_name and \
-                month in file_name:
-            file_path = os.path.join(folder_path, file_name)
-            max_temp, _, min_temp, _, \
-                humidity, _ = process_weather_data(file_path)
-
-            total_high_temp += max_temp
-            total_low_temp += min_temp
-            total_humidity += humidity
-            count += 1
-
-    if count == 0:
+    with weather_metrics.measure('average'):
+        if by_station:
+            print_station_report(
+                collect_station_aggregates(folder_path, year, month_number,
+                                           jobs, backend, io_concurrency,
+                                           rollup, dataset),
+                print_average_report)
+            return
+
+        aggregate = tree_reduce(
+            collect_aggregates(folder_path, year, month_number, store,
+                               backend=backend,
+                               io_concurrency=io_concurrency,
+                               rollup=rollup, dataset=dataset),
+            WeatherAggregate.merge, WeatherAggregate())
+        print_average_report(aggregate)
+
+
+def print_average_report(aggregate):
+
+    """
+    This function prints the average highest temperature, lowest
+    temperature and humidity of a month.
+
+    Parameters:
+        aggregate (WeatherAggregate): The aggregate of the month.
+
+    Returns:
+        This function does not return anything. It prints the averages.
+    """
+
+    if aggregate.count == 0:
         print("No data found for the given year and month.")
     else:
-        average_high_temp = total_high_temp / count
-        average_low_temp = total_low_temp / count
-        average_humidity = total_humidity / count
+        average_high_temp = aggregate.max_temperature.mean()
+        average_low_temp = aggregate.min_temperature.mean()
+        average_humidity = aggregate.max_humidity.mean()
 
         print('Average Highest Temperature:', average_high_temp, "C")
         print('Average Lowest Temperature:', average_low_temp, "C")
         print('Average Humidity:', average_humidity, "%")
 
 
+def parse_month_range(text):
+
+    """
+    This function parses a month in the format YYYY/MM, or a range
+    of months in the format YYYY/MM-YYYY/MM.
+
+    Parameters:
+        text (str): The month or range of months.
+
+    Returns:
+        months (list): The (year, month number) pairs in the range.
+        A ValueError is raised when the text is not valid.
+    """
+
+    bounds = []
+    for part in text.split('-'):
+        year, _, month = part.partition('/')
+        if not year.isdigit() or not month.isdigit() or \
+                not 1 <= int(month) <= 12:
+            raise ValueError('Invalid month: {}'.format(part))
+        bounds.append((int(year), int(month)))
+    if len(bounds) == 1:
+        bounds.append(bounds[0])
+
+    (first_year, first_month), (last_year, last_month) = bounds
+    return [(number // 12, number % 12 + 1)
+            for number in range(first_year * 12 + first_month - 1,
+                                last_year * 12 + last_month)]
+
+
 def draw_horizontal_bar_chart(max_temp, min_temp):
     """
     This function draws a horizontal bar chart
     to display the highest and lowest temperatures.
+    matplotlib is only imported the first time a chart is drawn,
+    so reports that never draw do not pay for loading it.
 
     Parameters:
         max_temp (float): The highest temperature value to be displayed.
@@ -203,13 +983,5 @@ def draw_horizontal_bar_chart(max_temp, min_temp):
         It displays the bar chart using matplotlib.
     """
 
-    max_temp_float = float(max_temp)
-    min_temp_float = float(min_temp)
-
-    plt.barh(['Max Temperature', 'Min Temperature'],
-             [max_temp_float, min_temp_float],
-             color=['red', 'blue'])
-    plt.xlabel('Temperature (°C)')
-    plt.ylabel('Temperature Type')
-    plt.title('Highest and Lowest Temperatures')
-    plt.show()
+    import weather_chart
+    weather_chart.draw_horizontal_bar_chart(max_temp, min_temp)
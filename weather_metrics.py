@@ -0,0 +1,355 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from itertools import repeat
+
+
+count_names = ['files_cached', 'files_parsed', 'rows_parsed',
+               'parse_errors']
+
+# upper bounds in seconds of the operation latency histogram buckets
+latency_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10, 30, 60]
+
+metric_prefix = 'weather'
+
+# the metrics being recorded, or None; every hook checks this first, so
+# that nothing else is done when no sink is configured
+active = None
+
+# the counts of the operation running in the current context; worker
+# threads started with asyncio.to_thread see those of their caller
+current_counts = contextvars.ContextVar('weather_metrics_counts',
+                                        default=None)
+
+
+def label_text(labels):
+    return ','.join('{}="{}"'.format(name, value)
+                    for name, value in sorted(labels.items()))
+
+
+class PrometheusSink:
+
+    """
+    Keeps the counters, gauges and latency histograms of the process
+    and rewrites them in the Prometheus text format after every
+    operation, for the textfile collector of the node exporter. The
+    file is replaced atomically, so it is never scraped half written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def counter(self, name, value, labels):
+        key = (name, label_text(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, labels):
+        self.gauges[(name, label_text(labels))] = value
+
+    def timing(self, name, seconds, labels):
+        key = (name, label_text(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [
+                [0] * len(latency_buckets), 0, 0.0]
+        for index, bound in enumerate(latency_buckets):
+            if seconds <= bound:
+                histogram[0][index] += 1
+        histogram[1] += 1
+        histogram[2] += seconds
+
+    def lines(self):
+        lines = []
+        for values, kind, suffix in ((self.counters, 'counter', '_total'),
+                                     (self.gauges, 'gauge', '')):
+            typed = set()
+            for (name, labels), value in sorted(values.items()):
+                name = '{}_{}{}'.format(metric_prefix, name, suffix)
+                if name not in typed:
+                    lines.append('# TYPE {} {}'.format(name, kind))
+                    typed.add(name)
+                lines.append('{}{{{}}} {}'.format(name, labels, value))
+
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            name = '{}_{}'.format(metric_prefix, name)
+            if name not in typed:
+                lines.append('# TYPE {} histogram'.format(name))
+                typed.add(name)
+            bucket_counts, count, total = histogram
+            for bound, bucket_count in zip(latency_buckets + ['+Inf'],
+                                           bucket_counts + [count]):
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                    name, labels + ',' if labels else '', bound,
+                    bucket_count))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, count))
+        return lines
+
+    def flush(self):
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(temporary_path, 'w') as metrics_file:
+                metrics_file.write('\n'.join(self.lines()) + '\n')
+            os.replace(temporary_path, self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        self.flush()
+
+
+class StatsdSink:
+
+    """
+    Sends every metric as a StatsD datagram over UDP as soon as it is
+    recorded. Label values are appended to the metric name, and
+    latencies are sent as timers so that the StatsD server builds
+    the histograms. Metrics that cannot be sent are dropped.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125):
+        import socket
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name, value, kind, labels):
+        name = '.'.join([metric_prefix, name] + [
+            str(value) for _, value in sorted(labels.items())])
+        try:
+            self.socket.sendto('{}:{}|{}'.format(name, value, kind).encode(),
+                               self.address)
+        except OSError:
+            pass
+
+    def counter(self, name, value, labels):
+        self.send(name, value, 'c', labels)
+
+    def gauge(self, name, value, labels):
+        self.send(name, value, 'g', labels)
+
+    def timing(self, name, seconds, labels):
+        self.send(name, round(seconds * 1000, 3), 'ms', labels)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.socket.close()
+
+
+class JsonLinesSink:
+
+    """
+    Appends every metric to a file as one JSON object per line, with
+    the time it was recorded, its type, name, value and labels.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def write(self, kind, name, value, labels):
+        self.file.write(json.dumps({
+            'time': round(time.time(), 3),
+            'type': kind,
+            'name': '{}_{}'.format(metric_prefix, name),
+            'value': value,
+            'labels': labels}) + '\n')
+
+    def counter(self, name, value, labels):
+        self.write('counter', name, value, labels)
+
+    def gauge(self, name, value, labels):
+        self.write('gauge', name, value, labels)
+
+    def timing(self, name, seconds, labels):
+        self.write('timing', name, seconds, labels)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def open_sink(spec):
+
+    """
+    This function opens the metrics sink described by a
+    --metrics argument.
+
+    Parameters:
+        spec (str): 'prometheus:PATH' for a Prometheus text file,
+        'statsd[:HOST:PORT]' for a StatsD server, by default
+        127.0.0.1:8125, or 'jsonl:PATH' for a JSON lines file.
+
+    Returns:
+        sink: The opened sink.
+    """
+
+    kind, _, target = spec.partition(':')
+    if kind == 'prometheus' and target:
+        return PrometheusSink(target)
+    if kind == 'jsonl' and target:
+        return JsonLinesSink(target)
+    if kind == 'statsd':
+        host, _, port = target.rpartition(':')
+        if not port.isdigit():
+            host, port = target, '8125'
+        return StatsdSink(host or '127.0.0.1', int(port))
+    raise ValueError('Unknown metrics sink: {}'.format(spec))
+
+
+class WeatherMetrics:
+
+    """
+    Hands the metrics of every finished operation to a sink. While an
+    operation runs, its files and rows are counted in a dictionary
+    held in a context variable, so operations answered at the same
+    time by the server are kept apart while the threads an operation
+    hands work to count into it. Counts made outside any operation
+    are not recorded.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.lock = threading.Lock()
+
+    def count(self, name, value=1):
+        counts = current_counts.get()
+        if counts is not None:
+            with self.lock:
+                counts[name] += value
+
+    def add(self, counts):
+        for name, value in counts.items():
+            self.count(name, value)
+
+    def record(self, operation, seconds, counts, failed):
+
+        """
+        This method sends the latency and counts of an operation to
+        the sink, along with its rows and files per second and the
+        share of its files answered from the cache.
+        """
+
+        labels = {'operation': operation}
+        files = counts['files_cached'] + counts['files_parsed']
+        with self.lock:
+            self.sink.timing('operation_seconds', seconds, labels)
+            for name in count_names:
+                self.sink.counter(name, counts[name], labels)
+            if failed:
+                self.sink.counter('operation_errors', 1, labels)
+            if seconds > 0:
+                self.sink.gauge('rows_per_second',
+                                counts['rows_parsed'] / seconds, labels)
+                self.sink.gauge('files_per_second', files / seconds, labels)
+            if files:
+                self.sink.gauge('cache_hit_ratio',
+                                counts['files_cached'] / files, labels)
+            self.sink.flush()
+
+
+class Operation:
+
+    """
+    A context manager that times a block as a named operation and
+    records it with its counts when the block ends. The counts of an
+    operation run inside another are added to the outer one as well.
+    """
+
+    __slots__ = ('metrics', 'name', 'started', 'counts', 'token')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        if self.metrics is not None:
+            self.counts = dict.fromkeys(count_names, 0)
+            self.token = current_counts.set(self.counts)
+            self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, *exc_info):
+        if self.metrics is None:
+            return
+        seconds = time.perf_counter() - self.started
+        current_counts.reset(self.token)
+        self.metrics.add(self.counts)
+        self.metrics.record(self.name, seconds, self.counts,
+                            exc_type is not None)
+
+
+def measure(name):
+    return Operation(active, name)
+
+
+def counted_call(function, *args):
+
+    """
+    This function is run in a worker process. It calls the function
+    and returns its result along with the counts it made, which the
+    parent adds to its own operation with map_counted.
+    """
+
+    global active
+    counts = dict.fromkeys(count_names, 0)
+    outer, active = active, WeatherMetrics(None)
+    token = current_counts.set(counts)
+    try:
+        return function(*args), counts
+    finally:
+        current_counts.reset(token)
+        active = outer
+
+
+def map_counted(executor, function, *iterables, chunksize=1):
+
+    """
+    This function maps a function over a process pool like
+    executor.map. While metrics are recorded, the counts made in the
+    worker processes are added to the operation of the caller, which
+    would otherwise lose them.
+
+    Returns:
+        results (list): The results, in order.
+    """
+
+    if active is None:
+        return list(executor.map(function, *iterables, chunksize=chunksize))
+
+    results = []
+    for result, counts in executor.map(counted_call, repeat(function),
+                                       *iterables, chunksize=chunksize):
+        active.add(counts)
+        results.append(result)
+    return results
+
+
+def start(spec):
+
+    """
+    This function starts sending metrics to the sink described by
+    spec, see open_sink.
+
+    Returns:
+        metrics (WeatherMetrics): The metrics being recorded.
+    """
+
+    global active
+    active = WeatherMetrics(open_sink(spec))
+    return active
+
+
+def stop():
+    global active
+    metrics, active = active, None
+    if metrics is not None:
+        metrics.sink.close()
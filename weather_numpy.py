@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+
+import weather_metrics
+import weather_profile
+from weather_aggregate import ColumnAggregate, WeatherAggregate
+from weather_func import (
+    highest_humidity,
+    highest_temperature,
+    lowest_temperature,
+    open_weather_file,
+    parse_date
+)
+
+
+def read_header(file_path):
+
+    """
+    This function finds the header line of a weather data file.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        line_number (int): The number of lines before the header.
+        header (list): The stripped column names, or None when
+        the file has no header.
+    """
+
+    with open_weather_file(file_path) as file:
+        for line_number, line in enumerate(file):
+            if line.strip():
+                return line_number, [name.strip() for name
+                                     in line.decode('utf-8').split(',')]
+    return 0, None
+
+
+def column_aggregate(values, dates, cast):
+
+    """
+    This function builds a ColumnAggregate from a NumPy column
+    with vectorized reductions. The first position of an extreme
+    is used, which is the earliest day since rows are in date order.
+    """
+
+    aggregate = ColumnAggregate()
+    if len(values) == 0:
+        return aggregate
+
+    aggregate.count = int(len(values))
+    aggregate.total = cast(values.sum())
+    aggregate.total_squares = cast(np.dot(values, values))
+
+    minimum_index = int(values.argmin())
+    aggregate.minimum = cast(values[minimum_index])
+    aggregate.minimum_date = parse_date(dates[minimum_index])
+
+    maximum_index = int(values.argmax())
+    aggregate.maximum = cast(values[maximum_index])
+    aggregate.maximum_date = parse_date(dates[maximum_index])
+    return aggregate
+
+
+def file_aggregate(file_path):
+
+    """
+    This function builds the aggregate of a weather data file with
+    NumPy. Only the date and the three report columns are loaded, in
+    a single bulk parse, and empty cells become NaN. Days with any of
+    the three values missing are masked out, the same days the Python
+    backend skips.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+
+    Returns:
+        aggregate (WeatherAggregate): The aggregate of the file.
+    """
+
+    line_number, header = read_header(file_path)
+    if header is None:
+        return WeatherAggregate()
+
+    indexes = (0,
+               header.index(highest_temperature),
+               header.index(lowest_temperature),
+               header.index(highest_humidity))
+    names = ('date', 'max_temperature', 'min_temperature', 'max_humidity')
+
+    # genfromtxt splits and converts in one go, charged to tokenizing
+    with warnings.catch_warnings(), open_weather_file(file_path) as file, \
+            weather_profile.stage('tokenizing'):
+        # lines such as the closing <!-- --> comment have too few columns
+        warnings.simplefilter('ignore')
+        data = np.genfromtxt(
+            file, delimiter=',', skip_header=line_number + 1,
+            usecols=indexes, invalid_raise=False, encoding='utf-8',
+            dtype=[(names[0], 'U10'), (names[1], 'f8'),
+                   (names[2], 'f8'), (names[3], 'f8')])
+    data = np.atleast_1d(data)
+
+    with weather_profile.stage('aggregating'):
+        mask = (data['date'] != '') & \
+            ~np.isnan(data['max_temperature']) & \
+            ~np.isnan(data['min_temperature']) & \
+            ~np.isnan(data['max_humidity'])
+        profile = weather_profile.current()
+        if profile is not None:
+            profile.counts['rows'] += len(data)
+            profile.counts['skipped'] += len(data) - int(mask.sum())
+        if weather_metrics.active is not None:
+            weather_metrics.active.count('files_parsed')
+            weather_metrics.active.count('rows_parsed', int(mask.sum()))
+            weather_metrics.active.count('parse_errors',
+                                         len(data) - int(mask.sum()))
+        data = data[mask]
+
+        aggregate = WeatherAggregate()
+        aggregate.max_temperature = column_aggregate(
+            data['max_temperature'], data['date'], float)
+        aggregate.min_temperature = column_aggregate(
+            data['min_temperature'], data['date'], float)
+        aggregate.max_humidity = column_aggregate(
+            data['max_humidity'], data['date'], int)
+    return aggregate
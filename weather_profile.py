@@ -0,0 +1,219 @@
+import threading
+import time
+
+
+stage_names = ['listing', 'reading', 'tokenizing', 'converting',
+               'aggregating', 'rendering']
+
+count_names = ['files', 'cached', 'rows', 'skipped', 'bytes']
+
+stage_labels = {
+    'listing': 'Directory listing',
+    'reading': 'File open/read',
+    'tokenizing': 'CSV tokenizing',
+    'converting': 'Type conversion',
+    'aggregating': 'Aggregation',
+    'rendering': 'Rendering'}
+
+# the profile being recorded, or None; every hook checks this first, so
+# that nothing else is done when the report is not profiled
+active = None
+
+
+def current():
+
+    """
+    This function returns the profile being recorded when called
+    from the main thread, and None otherwise. A profile is in a
+    single stage at a time, so the work of other threads, which
+    overlaps the main thread's, is left out rather than charged to
+    whatever stage the main thread happens to be in.
+    """
+
+    if active is not None and \
+            threading.current_thread() is threading.main_thread():
+        return active
+    return None
+
+
+class WeatherProfile:
+
+    """
+    The time spent in every stage of a report and the number of files,
+    rows and bytes it went through. The profile is always in exactly
+    one stage, or in none, and switching stages charges the time since
+    the last switch to the stage being left, so nested stages are not
+    counted twice.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(stage_names, 0.0)
+        self.counts = dict.fromkeys(count_names, 0)
+        self.stage = None
+        self.started = self.mark = time.perf_counter()
+        self.total = None
+        self.profiler = None
+
+    def switch(self, stage):
+
+        """
+        This method moves the profile into the given stage.
+
+        Parameters:
+            stage (str): A name from stage_names, or None.
+
+        Returns:
+            previous (str): The stage left, to switch back to.
+        """
+
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.seconds[self.stage] += now - self.mark
+        self.mark = now
+        previous, self.stage = self.stage, stage
+        return previous
+
+
+class Stage:
+
+    """
+    A context manager that keeps the active profile in a stage
+    for the duration of a block.
+    """
+
+    __slots__ = ('profile', 'name', 'previous')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.previous = self.profile.switch(self.name)
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.switch(self.previous)
+
+
+def stage(name):
+    return Stage(current(), name)
+
+
+class ProfiledFile:
+
+    """
+    A weather data file whose reads are charged to the reading stage
+    and counted in bytes. open_weather_file only returns these while
+    a profile is active on the main thread.
+    """
+
+    def __init__(self, file, profile):
+        self.file = file
+        self.profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        previous = self.profile.switch('reading')
+        try:
+            line = next(self.file)
+        finally:
+            self.profile.switch(previous)
+        self.profile.counts['bytes'] += len(line)
+        return line
+
+    def read(self, size=-1):
+        previous = self.profile.switch('reading')
+        try:
+            data = self.file.read(size)
+        finally:
+            self.profile.switch(previous)
+        self.profile.counts['bytes'] += len(data)
+        return data
+
+    def readline(self, size=-1):
+        previous = self.profile.switch('reading')
+        try:
+            line = self.file.readline(size)
+        finally:
+            self.profile.switch(previous)
+        self.profile.counts['bytes'] += len(line)
+        return line
+
+
+def start(dump_path=None):
+
+    """
+    This function starts recording a profile, and also runs cProfile
+    when the statistics are to be dumped to a file.
+
+    Parameters:
+        dump_path (str): The file to write the cProfile statistics
+        to, or None.
+
+    Returns:
+        profile (WeatherProfile): The profile being recorded.
+    """
+
+    global active
+    active = WeatherProfile()
+    if dump_path:
+        import cProfile
+        active.profiler = cProfile.Profile()
+        active.profiler.enable()
+    return active
+
+
+def stop(dump_path=None):
+    global active
+    profile, active = active, None
+    if profile.profiler is not None:
+        profile.profiler.disable()
+        profile.profiler.dump_stats(dump_path)
+    profile.switch(None)
+    profile.total = time.perf_counter() - profile.started
+    return profile
+
+
+def print_profile_report(profile, file=None):
+
+    """
+    This function prints the time spent in every stage, with its
+    share of the whole report, and the counts of a stopped profile.
+    Time outside all stages, such as writing cache entries and
+    printing, is shown as other.
+
+    Parameters:
+        profile (WeatherProfile): The profile returned by stop.
+        file (file): Where to print, standard output by default.
+
+    Returns:
+        This function does not return anything. It prints the profile.
+    """
+
+    print('{:<20} {:>10} {:>7}'.format('Stage', 'Seconds', 'Share'),
+          file=file)
+    other = profile.total - sum(profile.seconds.values())
+    for label, seconds in [(stage_labels[name], profile.seconds[name])
+                           for name in stage_names] + [('Other', other)]:
+        print('{:<20} {:>10.4f} {:>6.1f}%'.format(
+            label, seconds, 100 * seconds / profile.total), file=file)
+    print('{:<20} {:>10.4f}'.format('Total', profile.total), file=file)
+
+    counts = profile.counts
+    print('Files opened: {}, answered from the cache: {}'.format(
+        counts['files'], counts['cached']), file=file)
+    print('Rows read: {}, skipped for missing values: {}'.format(
+        counts['rows'], counts['skipped']), file=file)
+    print('Bytes read: {}'.format(counts['bytes']), file=file)
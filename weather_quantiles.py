@@ -0,0 +1,168 @@
+import math
+import random
+from array import array
+
+
+# seeded so that the same data always gives the same estimates
+compaction_random = random.Random(0)
+
+
+def percentile_fraction(name):
+
+    """
+    This function turns the name of a percentile aggregation,
+    such as p95 or p99.9, into the fraction of values below it.
+
+    Parameters:
+        name (str): The name of the aggregation.
+
+    Returns:
+        fraction (float): The fraction, or None when the name
+        is not a percentile from p0.1 to p100.
+    """
+
+    if not name.startswith('p'):
+        return None
+    try:
+        value = float(name[1:])
+    except ValueError:
+        return None
+    if not 0 < value <= 100:
+        return None
+    return value / 100
+
+
+class QuantileSketch:
+
+    """
+    A mergeable summary of a column of values that answers quantile
+    queries, after the KLL sketch. Values are kept in typed arrays
+    on levels, each value on level h standing for 2 ** h original
+    values. Level capacities shrink by a third per level down from k
+    at the top. When the sketch holds more values than all levels
+    together may, the lowest full level is sorted and every other
+    value moves one level up, so the sketch never holds much more
+    than about 3 * k values and the rank of an answer is off by
+    roughly 1.7 / k of the count.
+
+    A sketch of at most k values, such as that of a single month,
+    is exact. With k set to 0 the sketch is never compacted and
+    every quantile is exact.
+    """
+
+    __slots__ = ('k', 'count', 'levels')
+
+    def __init__(self, k=200):
+        self.k = k
+        self.count = 0
+        self.levels = [array('d')]
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def add(self, value):
+        self.levels[0].append(value)
+        self.count += 1
+        if self.k and len(self.levels[0]) >= self.capacity(0):
+            self.compress()
+
+    def extend(self, values):
+        self.levels[0].fromlist(list(values))
+        self.count += len(values)
+        if self.k:
+            self.compress()
+
+    def size(self):
+        return sum(len(values) for values in self.levels)
+
+    def compress(self):
+
+        """
+        This method compacts the lowest full level, and the next ones
+        as needed, until the sketch fits its total capacity again.
+        Which value of every sorted pair moves up is picked at random,
+        so the kept values are not biased towards either end.
+        """
+
+        while self.size() > sum(self.capacity(level)
+                                for level in range(len(self.levels))):
+            level = 0
+            while len(self.levels[level]) < self.capacity(level):
+                level += 1
+            if level + 1 == len(self.levels):
+                self.levels.append(array('d'))
+
+            ordered = sorted(self.levels[level])
+            # an odd value out stays behind so weights add up exactly
+            kept = len(ordered) % 2
+            offset = compaction_random.getrandbits(1)
+            self.levels[level + 1].extend(ordered[kept + offset::2])
+            self.levels[level] = array('d', ordered[:kept])
+
+    def merge(self, other):
+
+        """
+        This method combines two sketches into a new one covering
+        the values of both. Like ColumnAggregate.merge it can be
+        applied to files, months and years in any order.
+
+        Parameters:
+            other (QuantileSketch): The sketch to combine with.
+
+        Returns:
+            merged (QuantileSketch): The combined sketch.
+        """
+
+        sizes = [part.k for part in (self, other) if part.k]
+        merged = QuantileSketch(min(sizes) if sizes else 0)
+        merged.count = self.count + other.count
+        merged.levels = [array('d') for _ in range(
+            max(len(self.levels), len(other.levels)))]
+        for part in (self, other):
+            for level, values in enumerate(part.levels):
+                merged.levels[level].extend(values)
+        if merged.k:
+            merged.compress()
+        return merged
+
+    def quantile(self, fraction):
+
+        """
+        This method returns the smallest value that at least the given
+        fraction of all values are less than or equal to, which is the
+        nearest-rank percentile when the sketch is exact.
+
+        Parameters:
+            fraction (float): The fraction, such as 0.95 for p95.
+
+        Returns:
+            value (float): The value, or None when the sketch is empty.
+        """
+
+        if self.count == 0:
+            return None
+        if len(self.levels) == 1:
+            ordered = sorted(self.levels[0])
+            return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+        weighted = sorted((value, 1 << level)
+                          for level, values in enumerate(self.levels)
+                          for value in values)
+        rank = max(1, math.ceil(fraction * self.count))
+        running = 0
+        for value, weight in weighted:
+            running += weight
+            if running >= rank:
+                return value
+        return weighted[-1][0]
+
+    def to_list(self):
+        return [self.k, self.count] + [list(values) for values in self.levels]
+
+    @classmethod
+    def from_list(cls, values):
+        sketch = cls(values[0])
+        sketch.count = values[1]
+        sketch.levels = [array('d', level) for level in values[2:]]
+        return sketch
@@ -0,0 +1,282 @@
+import bisect
+import os
+from datetime import date
+from itertools import repeat
+
+import weather_catalog
+import weather_metrics
+from weather_aggregate import ColumnAggregate
+from weather_func import (
+    day_index,
+    open_weather_file,
+    read_header_indexes,
+    tree_reduce
+)
+from weather_quantiles import QuantileSketch, percentile_fraction
+
+
+# besides these, percentiles such as p50, p95 or p99.9 can be asked for
+aggregation_names = ['count', 'sum', 'min', 'max', 'mean', 'std']
+
+group_names = ['year', 'month', 'all']
+
+
+def scan_file(file_path, columns, group_by='year', where=None,
+              sketch_size=None):
+
+    """
+    This function reads a weather data file once and builds the
+    aggregates of every requested column for every group of days.
+    Lines are only split up to the last requested column. Empty,
+    missing or non-numeric cells are left out of their column only.
+    With a date range, the date metadata of the file is used to skip
+    it without opening it when none of its days are in the range,
+    and otherwise to read only the bytes from the first to the last
+    day of the range.
+
+    Parameters:
+        file_path (str): The path to the CSV
+        file containing weather data.
+        columns (list): The names of the columns to aggregate.
+        group_by (str): 'year', 'month' or 'all'.
+        where (tuple): Optional first and last day ordinal to include.
+        sketch_size (int): None when no percentiles are needed, 0 to
+        keep every value for exact percentiles, or the size k of the
+        QuantileSketch that estimates them.
+
+    Returns:
+        groups (dict): Per group key, one list of ColumnAggregate and
+        one list of QuantileSketch, empty without sketch_size, in the
+        order of columns. The key is (year,), (year, month) or ()
+        depending on group_by.
+    """
+
+    groups = {}
+    start = stop = None
+    if where is not None:
+        metadata = day_index(file_path)
+        if metadata['first_date'] is None or \
+                metadata['last_date'] < where[0] or \
+                metadata['first_date'] > where[1]:
+            return groups
+        if metadata['ordered']:
+            days = [day for day, _ in metadata['days']]
+            low = bisect.bisect_left(days, where[0])
+            high = bisect.bisect_right(days, where[1])
+            start = metadata['days'][low][1]
+            if high < len(days):
+                stop = metadata['days'][high][1]
+
+    with open_weather_file(file_path) as file:
+        try:
+            indexes = read_header_indexes(file, columns)
+        except ValueError:
+            raise ValueError('{} does not have all of the columns {}'.format(
+                os.path.basename(file_path), ', '.join(columns)))
+        if indexes is None:
+            return groups
+        last_column = max(indexes)
+        if weather_metrics.active is not None:
+            weather_metrics.active.count('files_parsed')
+
+        if start is not None:
+            if file.seekable():
+                file.seek(start)
+            else:
+                file.read(start - file.tell())
+        lines = file if stop is None else \
+            file.read(stop - file.tell()).splitlines()
+
+        for line in lines:
+            fields = line.rstrip(b'\r\n').split(b',', last_column + 1)
+            if len(fields) < 2:
+                continue
+            try:
+                year, month, day = fields[0].split(b'-')
+                day = date(int(year), int(month), int(day)).toordinal()
+            except ValueError:
+                continue
+            if where is not None and not where[0] <= day <= where[1]:
+                continue
+
+            if group_by == 'year':
+                key = (int(year),)
+            elif group_by == 'month':
+                key = (int(year), int(month))
+            else:
+                key = ()
+
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = (
+                    [ColumnAggregate() for _ in indexes],
+                    [QuantileSketch(sketch_size) for _ in indexes]
+                    if sketch_size is not None else [])
+            aggregates, sketches = group
+
+            for number, index in enumerate(indexes):
+                if index < len(fields) and fields[index]:
+                    try:
+                        value = float(fields[index])
+                    except ValueError:
+                        continue
+                    aggregates[number].add(value, day)
+                    if sketches:
+                        sketches[number].add(value)
+
+    return groups
+
+
+def merge_groups(first, second):
+    merged = dict(first)
+    for key, group in second.items():
+        if key in merged:
+            merged[key] = tuple([part.merge(other) for part, other
+                                 in zip(parts, other_parts)]
+                                for parts, other_parts
+                                in zip(merged[key], group))
+        else:
+            merged[key] = group
+    return merged
+
+
+def aggregation_value(aggregate, sketch, name):
+
+    """
+    This function reads one aggregation, such as 'mean', off a
+    ColumnAggregate, or a percentile off a QuantileSketch. Every
+    aggregation except 'count' is None when the column has no values.
+    """
+
+    fraction = percentile_fraction(name)
+    if fraction is not None:
+        return sketch.quantile(fraction)
+    if name == 'count':
+        return aggregate.count
+    if aggregate.count == 0:
+        return None
+    if name == 'sum':
+        return aggregate.total
+    if name == 'min':
+        return aggregate.minimum
+    if name == 'max':
+        return aggregate.maximum
+    if name == 'mean':
+        return aggregate.mean()
+    if name == 'std':
+        return aggregate.variance() ** 0.5
+    raise ValueError('Unknown aggregation: {}'.format(name))
+
+
+def query_files(folder_path, where=None):
+
+    """
+    This function returns the paths of the weather data files in the
+    folder that can hold days of the date range, using the catalog.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+    if where is None:
+        file_names = [entry[3] for entry in catalog.entries]
+    else:
+        first, last = (date.fromordinal(day) for day in where)
+        file_names = [
+            file_name
+            for number in range(first.year * 12 + first.month - 1,
+                                last.year * 12 + last.month)
+            for file_name in catalog.files(number // 12, number % 12 + 1)]
+    return [os.path.join(folder_path, file_name) for file_name in file_names]
+
+
+def query(folder_path, columns, aggregations=('min', 'max', 'mean'),
+          group_by='year', where=None, jobs=1, sketch_size=0):
+
+    """
+    This function answers a query over any columns of the weather
+    data files in a folder. Every file is read once, however many
+    columns and aggregations are asked for, and files outside the
+    date range are not opened.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        columns (list): The names of the columns, as in the header.
+        aggregations (list): Names from aggregation_names,
+        or percentiles such as p95.
+        group_by (str): 'year', 'month' or 'all'.
+        where (tuple): Optional first and last day ordinal to include.
+        jobs (int): The number of worker processes used
+        to read the files.
+        sketch_size (int): 0 for exact percentiles, found by sorting
+        the values of every group, or the size k of the mergeable
+        sketches that estimate them in bounded memory.
+
+    Returns:
+        rows (list): One (group key, results) pair per group in date
+        order, where results holds a dict of aggregation values for
+        every column.
+    """
+
+    for name in aggregations:
+        if name not in aggregation_names and \
+                percentile_fraction(name) is None:
+            raise ValueError('Unknown aggregation: {}'.format(name))
+    if group_by not in group_names:
+        raise ValueError('Unknown grouping: {}'.format(group_by))
+    if not any(percentile_fraction(name) for name in aggregations):
+        sketch_size = None
+
+    with weather_metrics.measure('query'):
+        file_paths = query_files(folder_path, where)
+
+        if jobs > 1 and len(file_paths) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = weather_metrics.map_counted(
+                    executor, scan_file, file_paths, repeat(columns),
+                    repeat(group_by), repeat(where), repeat(sketch_size),
+                    chunksize=max(1, len(file_paths) // (jobs * 4)))
+        else:
+            results = [scan_file(file_path, columns, group_by, where,
+                                 sketch_size)
+                       for file_path in file_paths]
+
+        groups = tree_reduce(results, merge_groups, {})
+    rows = []
+    for key in sorted(groups):
+        aggregates, sketches = groups[key]
+        rows.append((key, [{name: aggregation_value(aggregate, sketch, name)
+                            for name in aggregations}
+                           for aggregate, sketch in zip(
+                               aggregates, sketches or repeat(None))]))
+    return rows
+
+
+def print_query_report(columns, rows):
+
+    """
+    This function prints the rows returned by query, one line per
+    group and column.
+
+    Parameters:
+        columns (list): The names of the queried columns.
+        rows (list): The rows returned by query.
+
+    Returns:
+        This function does not return anything. It prints the results.
+    """
+
+    if not rows:
+        print("No data found for the given query.")
+        return
+
+    width = max(len(column) for column in columns)
+    for key, results in rows:
+        label = '-'.join('{:02d}'.format(part) for part in key) or 'All'
+        for column, values in zip(columns, results):
+            print('{:<7} {:<{}}  {}'.format(
+                label, column, width,
+                ', '.join('{} {}'.format(
+                    name,
+                    round(value, 2) if isinstance(value, float) else value)
+                    for name, value in values.items())))
@@ -1,16 +1,220 @@
 import argparse
 import os
+import sys
+import weather_metrics
+import weather_profile
+import weather_rollup
+import weather_store
+from weather_aggregate import WeatherAggregate
 from weather_func import (
+    collect_aggregates,
     draw_horizontal_bar_chart,
+    months,
+    parse_date,
+    parse_month_range,
+    tree_reduce,
     process_all_files_in_folder,
-    calculate_average_values
+    calculate_average_weather_data,
+    print_average_report,
+    print_station_report,
+    print_year_report
 )
 
 
+def chart_stations(args, stations):
+
+    """
+    This function returns the stations to draw a daily chart of: the
+    station given with --station, every station in turn when there
+    are several, or None alone for the days of a single station.
+    """
+
+    if args.station:
+        return [args.station]
+    if len(stations) > 1:
+        return stations
+    return [None]
+
+
+def query_server(args):
+
+    """
+    This function answers the -e, -a and -c flags from a running
+    weatherman server instead of reading the folder.
+
+    Parameters:
+        args (Namespace): The parsed command line arguments.
+
+    Returns:
+        This function does not return anything.
+        It prints the results and draws the chart.
+    """
+
+    try:
+        query_server_reports(args)
+    except ValueError as error:
+        print("Error: {}".format(error))
+
+
+def query_server_reports(args):
+    import weather_server
+
+    if args.year:
+        body = weather_server.query_server(args.server, 'year',
+                                           year=args.year)
+        print_year_report(WeatherAggregate.from_list(body['aggregate']))
+
+    if args.average:
+        year, _, month = args.average.partition('/')
+        if not year.isdigit() or month not in months:
+            print("Invalid month format. Please enter "
+                  "a valid month in the format MM.")
+            return
+        body = weather_server.query_server(args.server, 'average',
+                                           year=year, month=month)
+        print_average_report(WeatherAggregate.from_list(body['aggregate']))
+
+    if args.chart:
+        try:
+            chart_months = parse_month_range(args.chart)
+        except ValueError:
+            print("Invalid month format. Please enter "
+                  "a valid month in the format MM.")
+            return
+
+        stations = set()
+
+        def load_days(station):
+            dates, highs, lows = [], [], []
+            for year, month in chart_months:
+                params = {'year': year, 'month': month}
+                if station is not None:
+                    params['station'] = station
+                body = weather_server.query_server(args.server, 'chart',
+                                                   **params)
+                dates.extend(parse_date(day) for day in body['dates'])
+                highs.extend(body['highs'])
+                lows.extend(body['lows'])
+                stations.update(body.get('stations', []))
+            return dates, highs, lows
+
+        dates, highs, lows = load_days(args.station)
+        if not dates:
+            print("No data found for the given year and month.")
+        elif args.chart_style == 'summary':
+            draw_horizontal_bar_chart(max(highs), min(lows))
+        else:
+            import weather_chart
+            combined = args.chart_style == 'combined'
+            chart_names = chart_stations(args, sorted(stations))
+            if chart_names == [args.station]:
+                weather_chart.draw_daily_chart(dates, highs, lows, combined,
+                                               args.station)
+            else:
+                weather_chart.draw_station_charts(chart_names, load_days,
+                                                  combined)
+
+
+def query_database(args):
+
+    """
+    This function answers the -e, -a and -c flags from a SQLite
+    database written by 'weather_report.py ingest' instead of
+    reading the folder.
+
+    Parameters:
+        args (Namespace): The parsed command line arguments.
+
+    Returns:
+        This function does not return anything.
+        It prints the results and draws the chart.
+    """
+
+    import weather_db
+
+    path = args.db or weather_db.database_path(args.folder_path)
+    try:
+        connection = weather_db.connect(path)
+    except ValueError as error:
+        print("Error: {}".format(error))
+        return
+
+    try:
+        if args.year:
+            if args.by_station:
+                print_station_report(
+                    weather_db.station_aggregates(connection, args.year),
+                    print_year_report)
+            else:
+                print_year_report(tree_reduce(
+                    weather_db.database_aggregates(connection, args.year),
+                    WeatherAggregate.merge, WeatherAggregate()))
+
+        if args.average:
+            year, _, month = args.average.partition('/')
+            if not year.isdigit() or month not in months:
+                print("Invalid month format. Please enter "
+                      "a valid month in the format MM.")
+                return
+            if args.by_station:
+                print_station_report(
+                    weather_db.station_aggregates(connection, year, month),
+                    print_average_report)
+            else:
+                print_average_report(tree_reduce(
+                    weather_db.database_aggregates(connection, year, month),
+                    WeatherAggregate.merge, WeatherAggregate()))
+
+        if args.chart:
+            try:
+                chart_months = parse_month_range(args.chart)
+            except ValueError:
+                print("Invalid month format. Please enter "
+                      "a valid month in the format MM.")
+                return
+
+            dates, highs, lows = weather_db.day_columns(
+                connection, chart_months, args.station)
+            if not dates:
+                print("No data found for the given year and month.")
+            elif args.chart_style == 'summary':
+                draw_horizontal_bar_chart(max(highs), min(lows))
+            else:
+                import weather_chart
+                weather_chart.draw_station_charts(
+                    chart_stations(args, weather_db.stations(connection,
+                                                             chart_months)),
+                    lambda station: weather_db.day_columns(
+                        connection, chart_months, station),
+                    args.chart_style == 'combined')
+    finally:
+        connection.close()
+
+
 def main():
+    if sys.argv[1:2] == ['serve']:
+        import weather_server
+        weather_server.main(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ['convert']:
+        try:
+            import weather_arrow
+        except ImportError:
+            print("Error: Converting to Parquet needs pyarrow.")
+            sys.exit(1)
+        weather_arrow.main(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ['ingest']:
+        import weather_db
+        weather_db.main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Weatherman")
-    parser.add_argument("folder_path", help="Path to \
-        the folder containing weather data files.")
+    parser.add_argument("folder_path", nargs="?", help="Path to \
+        the folder containing weather data files. Not needed with --server \
+            or with a --db path.")
     parser.add_argument("-e", "--year", type=int, help="Display the \
         highest temperature, lowest temperature, \
             and humidity for a given year.")
@@ -19,33 +223,265 @@ def main():
             mean humidity for a given year and month in the format YYYY/MM.")
     parser.add_argument("-c", "--chart", help="Draw horizontal bar charts \
         for the highest and lowest temperature for a \
-            given year and month in the format YYYY/MM.")
+            given year and month in the format YYYY/MM, or for a range \
+                of months in the format YYYY/MM-YYYY/MM.")
+    parser.add_argument("--chart-style", choices=["daily", "combined",
+                                                  "summary"],
+                        default="daily", help="Chart a red and a blue bar \
+        for every day, one bar from the lowest to the highest temperature \
+            of every day, or only the highest and lowest temperature.")
+    parser.add_argument("--station", help="Only chart the days of this \
+        station with -c. Without it, a folder of several stations gets \
+            a daily chart of every station.")
+    parser.add_argument("--query", help="Display aggregates of any \
+        comma-separated columns, such as 'Max TemperatureC,Mean \
+            Humidity', reading every file only once.")
+    parser.add_argument("--agg", default="min,max,mean", help="Comma-\
+        separated aggregates for --query, out of count, sum, min, max, \
+            mean, std and percentiles such as p50, p95 or p99.")
+    parser.add_argument("--sketch-size", type=int, default=0, help="Estimate \
+        --query percentiles with mergeable sketches of this size in \
+            bounded memory. 0 finds exact percentiles.")
+    parser.add_argument("--group-by", choices=["year", "month", "all"],
+                        default="year", help="Group the --query results \
+        by year, by month or not at all.")
+    parser.add_argument("--between", nargs=2, metavar=("FIRST", "LAST"),
+                        help="Only include the days from FIRST to LAST \
+        in the format YYYY-MM-DD in --query.")
+    parser.add_argument("--store", action="store_true", help="Answer \
+        queries from the memory-mapped column store of the folder, \
+            building it first if it is missing or out of date.")
+    parser.add_argument("--build-store", action="store_true", help="Rebuild \
+        the memory-mapped column store of the folder.")
+    parser.add_argument("--rollup", action="store_true", help="Answer \
+        -e and -a from the monthly summaries of the folder, updating \
+            the summaries of changed files first.")
+    parser.add_argument("--trend", help="Display the extremes and \
+        averages of every year in the format YYYY or YYYY-YYYY, \
+            from the monthly summaries of the folder.")
+    parser.add_argument("--dataset", help="Answer -e and -a from the \
+        Parquet dataset written by 'weather_report.py convert' at this \
+            path. The weather data files are read instead when pyarrow \
+                is not installed.")
+    parser.add_argument("--db", nargs="?", const="", help="Answer -e, -a \
+        and -c with SQL queries on the SQLite database written by \
+            'weather_report.py ingest' at this path, or at its default \
+                path in the cache folder of folder_path.")
+    parser.add_argument("--by-station", action="store_true", help="Report \
+        -e and -a for every station in the file names, then for all \
+            stations together.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number \
+        of worker processes used to process the files of a year.")
+    parser.add_argument("--backend", choices=["python", "numpy"],
+                        default="python", help="Parse weather data files \
+        with the cached Python columns or in bulk with NumPy.")
+    parser.add_argument("--io-concurrency", type=int, default=0, help="Read \
+        weather data files with asyncio, keeping up to this many reads \
+            in flight. Useful on high-latency network storage.")
+    parser.add_argument("--render-dir", help="Write the -c charts as \
+        image files into this folder, one per month, instead of showing \
+            them.")
+    parser.add_argument("--render-format", choices=["png", "svg"],
+                        default="png", help="Image format of rendered \
+        charts.")
+    parser.add_argument("--server", help="Answer the queries from a \
+        weatherman server started with 'weather_report.py serve', \
+            such as http://127.0.0.1:8765.")
+    parser.add_argument("--profile", action="store_true", help="Print the \
+        time spent listing, reading, tokenizing, converting, aggregating \
+            and rendering, and the number of files, rows and bytes read, \
+                to standard error. Worker processes and threads are not \
+                    included.")
+    parser.add_argument("--profile-dump", metavar="FILE", help="Also run \
+        cProfile and write its statistics to FILE, for python -m pstats. \
+            Implies --profile.")
+    parser.add_argument("--metrics", metavar="SINK", help="Send the \
+        latency, rows and files per second, cache hit ratio and parse \
+            errors of every report to prometheus:PATH, a Prometheus \
+                text file, statsd[:HOST:PORT], a StatsD server over UDP, \
+                    or jsonl:PATH, a JSON lines file.")
 
     args = parser.parse_args()
 
+    if args.metrics:
+        try:
+            weather_metrics.start(args.metrics)
+        except (ValueError, OSError) as error:
+            print("Error: {}".format(error))
+            return
+
+    try:
+        if args.profile or args.profile_dump:
+            profile_report(parser, args)
+        else:
+            run_report(parser, args)
+    finally:
+        weather_metrics.stop()
+
+
+def profile_report(parser, args):
+
+    """
+    This function runs the report under a profile and prints the
+    profile to standard error, see weather_profile.
+    """
+
+    weather_profile.start(args.profile_dump)
+    try:
+        run_report(parser, args)
+    finally:
+        profile = weather_profile.stop(args.profile_dump)
+        weather_profile.print_profile_report(profile, sys.stderr)
+        if args.profile_dump:
+            print("cProfile statistics written to '{}'".format(
+                args.profile_dump), file=sys.stderr)
+
+
+def run_report(parser, args):
+
+    """
+    This function prints the reports and draws the charts asked
+    for on the command line.
+
+    Parameters:
+        parser (ArgumentParser): The parser, to report usage errors.
+        args (Namespace): The parsed command line arguments.
+
+    Returns:
+        This function does not return anything.
+    """
+
+    if args.server:
+        query_server(args)
+        return
+
+    if args.db is not None and (args.db or args.folder_path):
+        query_database(args)
+        return
+
+    if args.folder_path is None:
+        parser.error("the folder_path argument is required")
+
     if not os.path.exists(args.folder_path):
         print("Error: The folder path '{}' does not \
             exist.".format(args.folder_path))
         return
 
+    store = None
+    if args.store or args.build_store:
+        store = weather_store.open_store(args.folder_path,
+                                         rebuild=args.build_store)
+
+    dataset = None
+    if args.dataset:
+        try:
+            import weather_arrow
+            dataset = weather_arrow.open_dataset(args.dataset)
+        except ImportError:
+            print("pyarrow is not installed, reading the weather data "
+                  "files instead.", file=sys.stderr)
+        except ValueError as error:
+            print("Error: {}".format(error))
+            return
+
+    rollup = None
+    if args.rollup or args.trend:
+        rollup = weather_rollup.open_rollup(args.folder_path)
+
     if args.year:
-        process_all_files_in_folder(args.folder_path, args.year)
+        process_all_files_in_folder(args.folder_path, args.year, store,
+                                    args.jobs, args.backend,
+                                    args.io_concurrency,
+                                    rollup if args.rollup else None,
+                                    args.by_station, dataset)
+
+    if args.trend:
+        first, _, last = args.trend.partition('-')
+        if not first.isdigit() or not (last or first).isdigit():
+            print("Invalid year range. Please enter the years "
+                  "in the format YYYY or YYYY-YYYY.")
+            return
+        weather_rollup.print_trend_report(
+            rollup, range(int(first), int(last or first) + 1))
 
     if args.average:
-        year, month = args.average.split('/')
-        if not month.isdigit():
+        year, _, month = args.average.partition('/')
+        if not year.isdigit() or not month.isdigit():
             print("Invalid month format. Please enter \
                 a valid month in the format MM.")
             return
-        calculate_average_values(args.folder_path, year, month)
+        calculate_average_weather_data(args.folder_path, year, month, store,
+                                       args.backend, args.io_concurrency,
+                                       rollup if args.rollup else None,
+                                       args.by_station, args.jobs, dataset)
+
+    if args.query:
+        import weather_query
+        columns = [column.strip() for column in args.query.split(',')]
+        try:
+            where = None
+            if args.between:
+                where = tuple(parse_date(day) for day in args.between)
+            rows = weather_query.query(
+                args.folder_path, columns, args.agg.split(','),
+                args.group_by, where, args.jobs, args.sketch_size)
+        except ValueError as error:
+            print("Error: {}".format(error))
+            return
+        weather_query.print_query_report(columns, rows)
 
     if args.chart:
-        year, month = args.chart.split('/')
-        if not month.isdigit():
-            print("Invalid month format. Please enter \
-                a valid month in the format MM.")
+        try:
+            chart_months = parse_month_range(args.chart)
+        except ValueError:
+            print("Invalid month format. Please enter "
+                  "a valid month in the format MM.")
             return
-        draw_horizontal_bar_chart(args.folder_path, year, month)
+
+        import weather_chart
+        if args.chart_style == 'summary':
+            stations = [args.station]
+        else:
+            stations = chart_stations(args, weather_chart.chart_stations(
+                args.folder_path, chart_months))
+
+        if args.render_dir:
+            for output_path in weather_chart.render_charts(
+                    args.folder_path, chart_months, args.render_dir,
+                    args.render_format, args.jobs, args.chart_style,
+                    stations):
+                print(output_path)
+            return
+
+        if args.chart_style == 'summary' and args.station:
+            _, highs, lows = weather_chart.month_day_columns(
+                args.folder_path, chart_months, store, args.station)
+            if len(highs) == 0:
+                print("No data found for the given year and month.")
+                return
+            draw_horizontal_bar_chart(highs.max(), lows.min())
+            return
+
+        if args.chart_style == 'summary':
+            aggregate = tree_reduce(
+                [aggregate for year, month in chart_months
+                 for aggregate in collect_aggregates(
+                     args.folder_path, year, month, store,
+                     backend=args.backend)],
+                WeatherAggregate.merge, WeatherAggregate())
+            if aggregate.count == 0:
+                print("No data found for the given year and month.")
+                return
+            draw_horizontal_bar_chart(aggregate.max_temperature.maximum,
+                                      aggregate.min_temperature.minimum)
+            return
+
+        if not weather_chart.draw_station_charts(
+                stations,
+                lambda station: weather_chart.month_day_columns(
+                    args.folder_path, chart_months, store, station),
+                args.chart_style == 'combined'):
+            print("No data found for the given year and month.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+import bisect
+import json
+import os
+
+import weather_cache
+import weather_catalog
+from weather_aggregate import WeatherAggregate
+from weather_func import (
+    format_date,
+    stat_weather_file,
+    tree_reduce,
+    update_weather_cache
+)
+from weather_quantiles import QuantileSketch
+
+
+rollup_file_name = 'rollup.json'
+sketch_file_name = 'rollup_sketches.json'
+rollup_version = 3
+
+
+def rollup_path(folder_path, file_name=rollup_file_name):
+    return os.path.join(folder_path, weather_cache.cache_folder_name,
+                        file_name)
+
+
+def load_rollup_file(path):
+    try:
+        with open(path) as rollup_file:
+            content = json.load(rollup_file)
+        if content.get('version') == rollup_version:
+            return content['entries']
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def write_rollup_file(folder_path, path, entries):
+    try:
+        weather_cache.cache_dir(folder_path)
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'w') as rollup_file:
+            json.dump({'version': rollup_version, 'entries': entries},
+                      rollup_file, separators=(',', ':'))
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+class WeatherRollup:
+
+    """
+    The summary of every station and month in a folder: the aggregate
+    of its weather data file, the number of empty highest
+    temperature, lowest temperature and highest humidity cells, and
+    a QuantileSketch of each of these three columns. Year and trend
+    queries combine these summaries, about twelve per station and
+    year, instead of the daily rows. The summaries of a year are
+    brought up to date the first time the year is queried, so a
+    query only looks at the files of the years it covers. The
+    sketches are kept in a file of their own, which is only read
+    and updated for percentiles.
+    """
+
+    def __init__(self, folder_path, catalog, saved):
+        self.folder_path = folder_path
+        self.catalog = catalog
+        self.saved = saved
+        self.years = {}
+        self.saved_sketches = None
+
+    def year_entries(self, year):
+        entries = self.years.get(year)
+        if entries is None:
+            entries, changed = update_entries(
+                self.folder_path, self.catalog.select(year), self.saved)
+            self.years[year] = entries
+            if changed:
+                self.save()
+        return entries
+
+    def save(self):
+
+        """
+        This method writes the summaries of the years brought up to
+        date, and the saved summaries of the other years, to the
+        rollup file. Summaries of files no longer in the folder are
+        left out.
+        """
+
+        entries = []
+        for year, month, station, file_name in self.catalog.entries:
+            if year in self.years:
+                continue
+            entry = self.saved.get(file_name)
+            if entry is not None:
+                entries.append(entry)
+        for year_entries in self.years.values():
+            entries.extend(year_entries)
+
+        write_rollup_file(self.folder_path, rollup_path(self.folder_path),
+                          entries)
+
+    def months(self, year, month=None):
+        entries = self.year_entries(int(year))
+        if month is None:
+            return entries
+        months = [entry[1] for entry in entries]
+        return entries[bisect.bisect_left(months, int(month)):
+                       bisect.bisect_right(months, int(month))]
+
+    def aggregates(self, year, month=None):
+
+        """
+        This method returns the aggregate of every station and month
+        of the given year, or of a single month of it.
+
+        Parameters:
+            year (int): The year to look up.
+            month (int): The month number to look up, or None
+            for the whole year.
+
+        Returns:
+            aggregates (list): One WeatherAggregate per station and
+            month, in date order.
+        """
+
+        return [WeatherAggregate.from_list(entry[6])
+                for entry in self.months(year, month)]
+
+    def sketches(self, year, month=None):
+
+        """
+        This method merges the sketches of the highest temperature,
+        lowest temperature and highest humidity columns of the given
+        year, or of a single month of it.
+
+        Returns:
+            sketches (list): One QuantileSketch per column.
+        """
+
+        entries = self.months(year, month)
+        path = rollup_path(self.folder_path, sketch_file_name)
+        if self.saved_sketches is None:
+            self.saved_sketches = {entry[0]: entry
+                                   for entry in load_rollup_file(path) or []}
+
+        changed = False
+        file_sketches = []
+        for entry in entries:
+            saved = self.saved_sketches.get(entry[3])
+            if saved is None or saved[1:3] != entry[4:6]:
+                columns = update_weather_cache(
+                    os.path.join(self.folder_path, entry[3]))[1]
+                sketches = []
+                for column in columns[1:]:
+                    sketch = QuantileSketch()
+                    sketch.extend(column)
+                    sketches.append(sketch.to_list())
+                saved = self.saved_sketches[entry[3]] = [
+                    entry[3], entry[4], entry[5], sketches]
+                changed = True
+            file_sketches.append([QuantileSketch.from_list(sketch)
+                                  for sketch in saved[3]])
+
+        if changed:
+            file_names = {entry[3] for entry in self.catalog.entries}
+            write_rollup_file(self.folder_path, path, [
+                saved for file_name, saved in self.saved_sketches.items()
+                if file_name in file_names])
+
+        return tree_reduce(
+            file_sketches,
+            lambda first, second: [sketch.merge(other) for sketch, other
+                                   in zip(first, second)],
+            [QuantileSketch() for _ in range(3)])
+
+    def missing(self, year, month=None):
+        counts = [0, 0, 0]
+        for entry in self.months(year, month):
+            counts = [total + count
+                      for total, count in zip(counts, entry[7])]
+        return counts
+
+
+def update_entries(folder_path, catalog_entries, saved):
+
+    """
+    This function returns the summaries of the given catalog entries,
+    rebuilding through their cache entries those of the files whose
+    size or modification time changed since they were saved.
+
+    Returns:
+        entries (list): The summaries, in catalog order.
+        changed (bool): Whether any summary differs from the saved ones.
+    """
+
+    entries = []
+    changed = False
+    for year, month, station, file_name in catalog_entries:
+        file_path = os.path.join(folder_path, file_name)
+        try:
+            stat = stat_weather_file(file_path)
+        except OSError:
+            changed = changed or file_name in saved
+            continue
+
+        entry = saved.get(file_name)
+        if entry is None or entry[4] != stat.st_size or \
+                entry[5] != stat.st_mtime_ns:
+            state = {}
+            aggregate, _ = update_weather_cache(
+                file_path, with_columns=False, stat=stat, state=state)
+            entry = [year, month, station, file_name, stat.st_size,
+                     stat.st_mtime_ns, aggregate.to_list(),
+                     state.get('missing', [0, 0, 0])]
+            changed = True
+        entries.append(entry)
+    return entries, changed
+
+
+def open_rollup(folder_path):
+
+    """
+    This function returns the rollup of the given folder. Nothing but
+    the rollup file and the catalog is read until a year is queried,
+    and only the summaries of the queried years are brought up to
+    date, see WeatherRollup.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+
+    Returns:
+        rollup (WeatherRollup): The rollup of the folder.
+    """
+
+    saved = {entry[3]: entry
+             for entry in load_rollup_file(rollup_path(folder_path)) or []}
+    return WeatherRollup(folder_path, weather_catalog.load_catalog(
+        folder_path), saved)
+
+
+def print_trend_report(rollup, years):
+
+    """
+    This function prints the highest and lowest temperature, the
+    average highest and lowest temperature, the median, 95th and 99th
+    percentile of the daily highest temperatures, the number of
+    complete days and the number of empty cells of every year, using
+    only the rollup.
+
+    Parameters:
+        rollup (WeatherRollup): The rollup of the folder.
+        years (list): The years to report on.
+
+    Returns:
+        This function does not return anything. It prints the trend.
+    """
+
+    found = False
+    for year in years:
+        aggregate = tree_reduce(rollup.aggregates(year),
+                                WeatherAggregate.merge, WeatherAggregate())
+        if aggregate.count == 0:
+            continue
+        found = True
+
+        print('{}: Highest {} C on {}, Lowest {} C on {}'.format(
+            year, aggregate.max_temperature.maximum,
+            format_date(aggregate.max_temperature.maximum_date),
+            aggregate.min_temperature.minimum,
+            format_date(aggregate.min_temperature.minimum_date)))
+        print('      Average Highest {:.1f} C, Average Lowest {:.1f} C, '
+              '{} days, {} empty cells'.format(
+                  aggregate.max_temperature.mean(),
+                  aggregate.min_temperature.mean(),
+                  aggregate.count, sum(rollup.missing(year))))
+        highs = rollup.sketches(year)[0]
+        print('      Daily Highest p50 {} C, p95 {} C, p99 {} C'.format(
+            highs.quantile(0.5), highs.quantile(0.95),
+            highs.quantile(0.99)))
+
+    if not found:
+        print("No data found for the given years.")
@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+import weather_catalog
+import weather_metrics
+from weather_aggregate import WeatherAggregate
+from weather_func import (
+    format_date,
+    stat_weather_file,
+    tree_reduce,
+    update_weather_cache
+)
+
+
+default_host = '127.0.0.1'
+default_port = 8765
+
+
+class WeatherDataset:
+
+    """
+    The aggregates and daily columns of every weather data file in a
+    folder, kept in memory. refresh reloads only the files whose size
+    or modification time changed, and queries are answered from the
+    loaded columns with per-year and per-month results memoised until
+    the next change.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.lock = threading.Lock()
+        self.files = {}
+        self.months = {}
+        self.memo = {}
+        self.refresh()
+
+    def refresh(self):
+
+        """
+        This method brings the dataset up to date with the folder.
+
+        Returns:
+            changed (int): The number of files that were (re)loaded.
+        """
+
+        files = {}
+        changed = 0
+        with weather_metrics.measure('refresh'):
+            catalog = weather_catalog.load_catalog(self.folder_path)
+            for year, month, station, file_name in catalog.entries:
+                file_path = os.path.join(self.folder_path, file_name)
+                try:
+                    stat = stat_weather_file(file_path)
+                except OSError:
+                    continue
+
+                signature = (stat.st_size, stat.st_mtime_ns)
+                loaded = self.files.get(file_name)
+                if loaded is None or loaded[0] != signature:
+                    aggregate, columns = update_weather_cache(file_path)
+                    loaded = (signature, station, aggregate, columns)
+                    changed += 1
+                files[file_name] = loaded
+
+        if changed or files.keys() != self.files.keys():
+            months = {}
+            for year, month, _, file_name in catalog.entries:
+                if file_name in files:
+                    months.setdefault((year, month), []).append(
+                        files[file_name])
+            with self.lock:
+                self.files, self.months, self.memo = files, months, {}
+        return changed
+
+    def month_files(self, year, month=None):
+        with self.lock:
+            months, memo = self.months, self.memo
+        if month is None:
+            return [loaded for number in range(1, 13)
+                    for loaded in months.get((year, number), [])], memo
+        return months.get((year, month), []), memo
+
+    def aggregate(self, year, month=None):
+
+        """
+        This method returns the aggregate of a year, or of a single
+        month of it.
+
+        Parameters:
+            year (int): The year to look up.
+            month (int): The month number, or None for the whole year.
+
+        Returns:
+            aggregate (WeatherAggregate): The aggregate.
+        """
+
+        files, memo = self.month_files(year, month)
+        aggregate = memo.get((year, month))
+        if aggregate is None:
+            aggregate = tree_reduce([loaded[2] for loaded in files],
+                                    WeatherAggregate.merge,
+                                    WeatherAggregate())
+            memo[(year, month)] = aggregate
+        return aggregate
+
+    def chart(self, year, month, station=None):
+
+        """
+        This method returns the daily highest and lowest temperatures
+        of a month, as drawn by the chart mode.
+
+        Parameters:
+            year (int): The year to look up.
+            month (int): The month number.
+            station (str): The station to chart, or None for the days
+            of every station one after another.
+
+        Returns:
+            chart (dict): Lists of 'dates', 'highs' and 'lows', and the
+            'stations' with data for the month.
+        """
+
+        files, _ = self.month_files(year, month)
+        chart = {'dates': [], 'highs': [], 'lows': [],
+                 'stations': sorted({loaded[1] for loaded in files})}
+        for loaded in files:
+            if station is not None and loaded[1] != station:
+                continue
+            dates, highs, lows, _ = loaded[3]
+            chart['dates'].extend(format_date(day) for day in dates)
+            chart['highs'].extend(highs)
+            chart['lows'].extend(lows)
+        return chart
+
+
+class WeatherRequestHandler(BaseHTTPRequestHandler):
+
+    """
+    Answers GET /year?year=YYYY, /average?year=YYYY&month=MM and
+    /chart?year=YYYY&month=MM[&station=NAME] with JSON from the server's
+    dataset.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0]
+                  for name, values in parse_qs(url.query).items()}
+        dataset = self.server.dataset
+
+        if url.path not in ('/year', '/average', '/chart'):
+            self.send_json(404, {'error': 'Unknown query.'})
+            return
+
+        try:
+            with weather_metrics.measure('serve_' + url.path[1:]):
+                if url.path == '/year':
+                    body = {'aggregate': dataset.aggregate(
+                        int(params['year'])).to_list()}
+                elif url.path == '/average':
+                    body = {'aggregate': dataset.aggregate(
+                        int(params['year']), int(params['month'])).to_list()}
+                else:
+                    body = dataset.chart(int(params['year']),
+                                         int(params['month']),
+                                         params.get('station'))
+        except (KeyError, ValueError) as error:
+            self.send_json(400, {'error': 'Invalid query: {}'.format(error)})
+            return
+
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def watch_folder(dataset, poll_interval):
+    while True:
+        time.sleep(poll_interval)
+        try:
+            dataset.refresh()
+        except OSError:
+            pass
+
+
+def serve(folder_path, host=default_host, port=default_port,
+          poll_interval=5.0):
+
+    """
+    This function loads the folder into memory once and answers
+    queries over HTTP until interrupted. A background thread polls
+    the folder for added, removed or changed files.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        poll_interval (float): Seconds between checks for changes.
+
+    Returns:
+        This function does not return until interrupted.
+    """
+
+    server = ThreadingHTTPServer((host, port), WeatherRequestHandler)
+    server.dataset = WeatherDataset(folder_path)
+
+    threading.Thread(target=watch_folder,
+                     args=(server.dataset, poll_interval),
+                     daemon=True).start()
+
+    print("Serving '{}' on http://{}:{}".format(
+        folder_path, host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def query_server(server_url, query, **params):
+
+    """
+    This function sends a query to a running weatherman server. A
+    server that cannot be reached, or that rejects the query, raises
+    a ValueError with the reason.
+
+    Parameters:
+        server_url (str): The address of the server,
+        such as http://127.0.0.1:8765.
+        query (str): 'year', 'average' or 'chart'.
+        params: The query parameters, such as year and month.
+
+    Returns:
+        body (dict): The decoded JSON answer.
+    """
+
+    url = '{}/{}?{}'.format(server_url.rstrip('/'), query, urlencode(params))
+    try:
+        with urlopen(url) as response:
+            return json.loads(response.read())
+    except OSError as error:
+        raise ValueError("The server at '{}' did not answer: {}".format(
+            server_url, getattr(error, 'reason', error)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="weather_report.py serve",
+                                     description="Weatherman query server")
+    parser.add_argument("folder_path", help="Path to \
+        the folder containing weather data files.")
+    parser.add_argument("--host", default=default_host, help="Address \
+        to listen on.")
+    parser.add_argument("--port", type=int, default=default_port,
+                        help="Port to listen on.")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="Seconds between checks for changed files.")
+    parser.add_argument("--metrics", metavar="SINK", help="Send the \
+        latency and counts of every query and refresh to \
+            prometheus:PATH, statsd[:HOST:PORT] or jsonl:PATH.")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.folder_path):
+        print("Error: The folder path '{}' does not "
+              "exist.".format(args.folder_path))
+        return
+
+    if args.metrics:
+        try:
+            weather_metrics.start(args.metrics)
+        except (ValueError, OSError) as error:
+            print("Error: {}".format(error))
+            return
+
+    try:
+        serve(args.folder_path, args.host, args.port, args.poll_interval)
+    finally:
+        weather_metrics.stop()
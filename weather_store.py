@@ -0,0 +1,234 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+import weather_cache
+import weather_catalog
+from weather_func import (
+    column_types,
+    load_weather_columns,
+    stat_weather_file
+)
+
+
+store_file_name = 'weather.store'
+store_magic = b'WSTORE02'
+
+# magic, folder mtime, number of files, number of rows
+header_struct = struct.Struct('<8sqII')
+# year, month, first row, number of rows, file size, file mtime
+entry_struct = struct.Struct('<HBxIIqq')
+
+
+def store_path(folder_path):
+    return os.path.join(folder_path, weather_cache.cache_folder_name,
+                        store_file_name)
+
+
+def column_offsets(entry_count, row_count):
+
+    """
+    This function works out where every column starts in a store
+    file. Columns are laid out one after another behind the header
+    and the file table, each aligned to 8 bytes.
+
+    Parameters:
+        entry_count (int): The number of months in the store.
+        row_count (int): The number of rows in every column.
+
+    Returns:
+        offsets (list): The byte offset of every column.
+        end (int): The size of the store file in bytes.
+    """
+
+    offset = header_struct.size + entry_count * entry_struct.size
+    offsets = []
+    for _, typecode in column_types:
+        offset += -offset % 8
+        offsets.append(offset)
+        offset += row_count * struct.calcsize(typecode)
+    return offsets, offset
+
+
+def build_store(folder_path):
+
+    """
+    This function compacts all monthly weather data files in the
+    given folder into a single store file with fixed-width columns
+    and a table of the files, ordered by year, month and station.
+    Every file keeps its size and modification time, so that changes
+    made to it later can be told.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+
+    Returns:
+        This function does not return anything.
+        It writes the store file into the cache folder.
+    """
+
+    catalog = weather_catalog.load_catalog(folder_path)
+
+    months = []
+    for year, month, _, file_name in catalog.entries:
+        file_path = os.path.join(folder_path, file_name)
+        stat = stat_weather_file(file_path)
+        months.append(((year, month), stat, load_weather_columns(file_path)))
+
+    row_count = sum(len(columns[0]) for _, _, columns in months)
+    offsets, end = column_offsets(len(months), row_count)
+
+    path = store_path(folder_path)
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        weather_cache.cache_dir(folder_path)
+        with open(temporary_path, 'wb') as store_file:
+            store_file.write(header_struct.pack(
+                store_magic, catalog.folder_mtime_ns, len(months),
+                row_count))
+
+            first_row = 0
+            for (year, month), stat, columns in months:
+                store_file.write(entry_struct.pack(
+                    year, month, first_row, len(columns[0]), stat.st_size,
+                    stat.st_mtime_ns))
+                first_row += len(columns[0])
+
+            for index, offset in enumerate(offsets):
+                store_file.write(b'\0' * (offset - store_file.tell()))
+                for _, _, columns in months:
+                    columns[index].tofile(store_file)
+            store_file.truncate(end)
+        os.replace(temporary_path, path)
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+class WeatherStore:
+
+    """
+    A read-only view of a store file. Column slices returned by
+    this class are memoryviews into the memory-mapped file, so no
+    data is copied until the values are used.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as store_file:
+            self.map = mmap.mmap(store_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        (magic, self.folder_mtime_ns,
+         entry_count, row_count) = header_struct.unpack_from(self.view)
+        if magic != store_magic:
+            self.close()
+            raise ValueError('Not a weather store file: ' + path)
+
+        self.entries = [
+            entry_struct.unpack_from(
+                self.view, header_struct.size + index * entry_struct.size)
+            for index in range(entry_count)]
+        self.keys = [(year, month) for year, month, *_ in self.entries]
+
+        offsets, _ = column_offsets(entry_count, row_count)
+        self.columns = [
+            self.view[offset:offset + row_count * struct.calcsize(typecode)]
+            .cast(typecode)
+            for offset, (_, typecode) in zip(offsets, column_types)]
+
+    def slices(self, year, month=None):
+
+        """
+        This method returns the columns of every monthly file
+        stored for the given year, or for a single month of it.
+
+        Parameters:
+            year (int): The year to look up.
+            month (int): The month number to look up, or None
+            for the whole year.
+
+        Returns:
+            slices (list): One list of column memoryviews per file.
+        """
+
+        year = int(year)
+        if month is None:
+            low = bisect.bisect_left(self.keys, (year, 0))
+            high = bisect.bisect_left(self.keys, (year + 1, 0))
+        else:
+            low = bisect.bisect_left(self.keys, (year, int(month)))
+            high = bisect.bisect_right(self.keys, (year, int(month)))
+
+        return [[column[first_row:first_row + rows]
+                 for column in self.columns]
+                for _, _, first_row, rows, _, _ in self.entries[low:high]]
+
+    def close(self):
+        for column in self.columns:
+            column.release()
+        self.columns = []
+        self.view.release()
+        self.map.close()
+
+
+def open_store(folder_path, rebuild=False):
+
+    """
+    This function opens the store file of the given folder. The store
+    is rebuilt first when it does not exist, when files have been
+    added to, removed from or changed in the folder since it was
+    built, or when rebuild is set. A file counts as changed when its
+    size or modification time differ from those in the store. When
+    the store cannot be written, such as in a read-only folder, a
+    note is printed to standard error and no store is returned, so
+    the weather data files are read instead.
+
+    Parameters:
+        folder_path (str): The path to the folder
+        containing weather data files.
+        rebuild (bool): Rebuild the store even if it looks current.
+
+    Returns:
+        store (WeatherStore): The opened store, or None.
+    """
+
+    path = store_path(folder_path)
+    if not rebuild and os.path.exists(path):
+        try:
+            store = WeatherStore(path)
+        except (ValueError, struct.error):
+            store = None
+        if store is not None:
+            if is_current(store, folder_path):
+                return store
+            store.close()
+
+    try:
+        build_store(folder_path)
+    except OSError as error:
+        print("Could not write the store of '{}', reading the weather "
+              "data files instead: {}".format(folder_path, error),
+              file=sys.stderr)
+        return None
+    return WeatherStore(path)
+
+
+def is_current(store, folder_path):
+    catalog = weather_catalog.load_catalog(folder_path)
+    if store.folder_mtime_ns != catalog.folder_mtime_ns or \
+            len(store.entries) != len(catalog.entries):
+        return False
+    for entry, stored in zip(catalog.entries, store.entries):
+        size, mtime_ns = stored[4:]
+        try:
+            stat = stat_weather_file(os.path.join(folder_path, entry[3]))
+        except OSError:
+            return False
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            return False
+    return True